@@ -5,14 +5,30 @@ from .config import settings
 from .schemas import UserClaims
 from jwt import InvalidTokenError, ExpiredSignatureError
 from .metrics_registry import errors_total
+from .tracing import span
+from . import active_users
 
 security = HTTPBearer()
+_pwd_context = None
+
+
+def get_pwd_context():
+    """bcrypt password context; passlib is imported on first use to keep startup fast."""
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
 
 async def get_current_user(creds: HTTPAuthorizationCredentials = Security(security)) -> UserClaims:
     token = creds.credentials
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGO], options={"require":["exp"]})
-        return UserClaims(**payload)
+        with span("auth.jwt", phase="auth"):
+            payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGO], options={"require":["exp"]})
+            claims = UserClaims(**payload)
+        active_users.record(claims.sub)
+        return claims
     except ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token has expired")
     except InvalidTokenError:
@@ -4,13 +4,76 @@ from typing import Optional
 class Settings(BaseSettings):
     MONGO_URI: str = "mongodb://localhost:27017/assignment"
     DB_NAME: str = "assignment"
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 2000
+    MONGO_COMPRESSORS: str = ""  # e.g. "zstd,snappy,zlib"
+    MONGO_COMMAND_MONITORING: bool = True
+    MONGO_SLOW_QUERY_MS: float = 100.0
     JWT_SECRET: str
     JWT_ALGO: str = "HS256"
     CREDITS_PER_ACTION: int = 5
+    AD_DAILY_LIMIT: int = 3
+    RATE_LIMIT_TTL_SECONDS: int = 2 * 24 * 3600
+
+    METRICS_CACHE_TTL_SECONDS: float = 5.0
+    METRICS_CACHE_MAX_ENTRIES: int = 10000
+    METRICS_RECONCILE_SECONDS: int = 15 * 60
+
+    AUDIT_RETENTION_DAYS: int = 180
+    AUDIT_ROLLUP_INTERVAL_SECONDS: int = 10 * 60
+
+    DISPATCHER_ENABLED: bool = False
+    DISPATCHER_WORKERS: int = 4
+    DISPATCHER_BATCH_SIZE: int = 20
+    DISPATCHER_LEASE_SECONDS: int = 60
+    DISPATCHER_MAX_ATTEMPTS: int = 5
+    DISPATCHER_RETRY_BACKOFF_SECONDS: float = 30.0
+    DISPATCHER_POLL_SECONDS: float = 1.0
+    DISPATCHER_HTTP_TIMEOUT: float = 10.0
+    SMTP_HOST: str = "localhost"
+    SMTP_PORT: int = 25
+    SMTP_FROM: str = "noreply@localhost"
 
     OPENAI_API_KEY: Optional[str] = None
     ALLOWED_ORIGINS: list[str] = []
 
+    FAST_START: bool = False
+    ACTIVE_USERS_REFRESH_SECONDS: float = 5.0
+    ACTIVE_USERS_SKETCH_DIR: Optional[str] = None  # defaults to PROMETHEUS_MULTIPROC_DIR
+    PROFILER_INTERVAL_MS: float = 5.0
+    PROFILER_SESSION_TIMEOUT: float = 300.0  # a request session ends after this even if its route is never hit
+    TRACING_ENABLED: bool = True
+    TRACING_EXPORTER: str = "none"  # none | file | otlp
+    TRACING_FILE: str = "spans.jsonl"
+    TRACING_SERVICE_NAME: str = "document-automation-service"
+
+    SEARCH_CACHE_MAX_ENTRIES: int = 2000
+    SEARCH_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    SEARCH_CACHE_TTL_SECONDS: float = 600.0
+    DOC_CACHE_MAX_ENTRIES: int = 5000
+    DOC_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    DOC_CACHE_TTL_SECONDS: float = 600.0
+    TAG_CACHE_MAX_ENTRIES: int = 10000
+    TAG_CACHE_TTL_SECONDS: float = 300.0
+    TAG_CACHE_VERIFY_SECONDS: float = 30.0
+    GRIDFS_DEDUP: bool = True
+    GRIDFS_DEDUP_SWEEP_SECONDS: float = 3600.0
+    GRIDFS_DEDUP_SWEEP_BATCH: int = 500
+    COMPRESSION_AT_REST: str = "zstd"  # zstd | gzip | none
+    COMPRESSION_MIN_BYTES: int = 1024
+    TEXT_CONTENT_COMPRESS_BYTES: int = 4096
+    RESPONSE_COMPRESSION_ENABLED: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    SUGGEST_MIN_SCORE: float = 0.5
+    EXPORT_BATCH_SIZE: int = 500
+    ARCHIVE_READ_AHEAD_CHUNKS: int = 4
+    ARCHIVE_DEFLATE_LEVEL: int = 6
+    THUMBNAIL_WORKERS: int = 2
+    THUMBNAIL_QUALITY: int = 80
+    THUMBNAIL_MAX_AGE_SECONDS: int = 365 * 24 * 3600
+
     CREATE_DEFAULT_ADMIN: bool = True
     DEFAULT_ADMIN_EMAIL: str = ""
     DEFAULT_ADMIN_PASSWORD: str = ""
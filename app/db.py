@@ -1,23 +1,54 @@
 from fastapi import Request, Depends
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
 from .config import settings
+from .db_monitoring import PoolMetricsListener, CommandMetricsListener
+from .tracing import TracingCommandListener
 
 _client = None
 
+
+def create_client(uri: str | None = None) -> AsyncIOMotorClient:
+    """
+    Builds a Motor client with the pool settings from config.
+    Everything (routes, services, tests) should get its client from here.
+    """
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [PoolMetricsListener()],
+    }
+    if settings.MONGO_COMMAND_MONITORING:
+        options["event_listeners"].append(CommandMetricsListener())
+    if settings.TRACING_ENABLED:
+        options["event_listeners"].append(TracingCommandListener())
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    return AsyncIOMotorClient(uri or settings.MONGO_URI, **options)
+
+
 def get_client():
     global _client
     if _client is None:
-        _client = AsyncIOMotorClient(settings.MONGO_URI)
+        _client = create_client()
     return _client
 
-async def get_db(request: Request):
-    # # If pytest override injected a test DB:
-    # if hasattr(request.app, "override_db") and request.app.override_db:
-    #     return request.app.override_db
 
-    # # Use db attached by lifespan
-    # if hasattr(request.app, "db") and request.app.db:
-    #     return request.app.db
+def close_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
 
-    # # Fallback (should not happen in tests)
+
+async def ensure_core_indexes(db):
+    await db.documents.create_index([("ownerId", ASCENDING), ("createdAt", DESCENDING)])
+    await db.document_tags.create_index([("documentId", ASCENDING)])
+    await db.document_tags.create_index([("tagId", ASCENDING), ("isPrimary", ASCENDING)])
+    await db.tags.create_index([("ownerId", ASCENDING), ("name", ASCENDING)])
+
+
+async def get_db(request: Request):
     return get_client()[settings.DB_NAME]
@@ -0,0 +1,155 @@
+from pymongo import monitoring
+from .config import settings
+from .metrics_registry import (
+    mongo_pool_checkout_wait_seconds,
+    mongo_pool_checkout_failures_total,
+    mongo_pool_connections,
+    mongo_pool_in_use,
+    mongo_command_duration_seconds,
+    mongo_command_failures_total,
+)
+import json, logging
+
+slow_query_log = logging.getLogger("mongo.slow")
+
+# Handshake/auth/topology chatter is not worth a histogram series
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "saslStart", "saslContinue",
+    "authenticate", "getnonce", "endSessions", "killCursors",
+}
+# These are structural, not user data, and keep a $lookup readable in the slow log
+KEPT_KEYS = {"from", "localField", "foreignField", "as"}
+
+
+def _addr(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Exports connection pool state per server address:
+    checkout wait time, open connections and connections checked out.
+    """
+
+    def pool_created(self, event):
+        mongo_pool_connections.labels(_addr(event)).set(0)
+        mongo_pool_in_use.labels(_addr(event)).set(0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        mongo_pool_connections.labels(_addr(event)).set(0)
+        mongo_pool_in_use.labels(_addr(event)).set(0)
+
+    def connection_created(self, event):
+        mongo_pool_connections.labels(_addr(event)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.labels(_addr(event)).dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_checkout_failures_total.labels(_addr(event), str(event.reason)).inc()
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            mongo_pool_checkout_wait_seconds.labels(_addr(event)).observe(duration)
+
+    def connection_checked_out(self, event):
+        mongo_pool_in_use.labels(_addr(event)).inc()
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            mongo_pool_checkout_wait_seconds.labels(_addr(event)).observe(duration)
+
+    def connection_checked_in(self, event):
+        mongo_pool_in_use.labels(_addr(event)).dec()
+
+
+def command_collection(command_name: str, command: dict) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", ""))
+    value = command.get(command_name)
+    return value if isinstance(value, str) else ""
+
+
+def redact_shape(value, key: str | None = None):
+    """
+    Replaces literal values with "?" while keeping operators, field names and
+    field paths ("$tags.name"), so the filter shape can be logged safely.
+    """
+    if isinstance(value, dict):
+        return {k: redact_shape(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        shaped = [redact_shape(v) for v in value]
+        return shaped if any(isinstance(v, (dict, list)) for v in shaped) else "?"
+    if isinstance(value, str) and (key in KEPT_KEYS or value.startswith("$")):
+        return value
+    return "?"
+
+
+def _query_shape(command_name: str, command: dict):
+    if command_name == "aggregate":
+        return redact_shape(command.get("pipeline", []))
+    if command_name in ("find", "count", "distinct"):
+        return redact_shape(command.get("filter", command.get("query", {})))
+    if command_name == "findAndModify":
+        return redact_shape(command.get("query", {}))
+    if command_name == "update":
+        return [redact_shape(u.get("q", {})) for u in command.get("updates", [])[:1]]
+    if command_name == "delete":
+        return [redact_shape(d.get("q", {})) for d in command.get("deletes", [])[:1]]
+    return None
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Records per-command latency labeled by command name and collection,
+    counts failures, and logs the redacted query shape of commands slower
+    than MONGO_SLOW_QUERY_MS.
+    """
+
+    def __init__(self, slow_ms: float | None = None):
+        self.slow_ms = settings.MONGO_SLOW_QUERY_MS if slow_ms is None else slow_ms
+        # (connection_id, request_id) -> (collection, command); the command is only
+        # redacted once it turns out to be slow, keeping the common path cheap
+        self._inflight = {}
+
+    def _key(self, event):
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        command = event.command
+        self._inflight[self._key(event)] = (command_collection(event.command_name, command), command)
+
+    def _finish(self, event, failed: bool):
+        info = self._inflight.pop(self._key(event), None)
+        if info is None:
+            return
+        collection, command = info
+        seconds = event.duration_micros / 1_000_000
+        mongo_command_duration_seconds.labels(event.command_name, collection).observe(seconds)
+        if failed:
+            mongo_command_failures_total.labels(event.command_name, collection).inc()
+        if seconds * 1000 >= self.slow_ms:
+            shape = _query_shape(event.command_name, command)
+            slow_query_log.warning(
+                "slow mongo command %s on %s took %.1fms shape=%s",
+                event.command_name, collection, seconds * 1000, json.dumps(shape, default=str),
+            )
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
@@ -0,0 +1,20 @@
+import threading
+from .config import settings
+
+# openai is the most expensive import in the app (~300 ms), so it is only
+# pulled in when the first OCR/action request needs a client, or when the
+# lifespan warms it up after the server is already accepting traffic.
+_openai_client = None
+_lock = threading.Lock()
+
+
+def get_openai_client():
+    """The shared AsyncOpenAI client, created on first use."""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                from openai import AsyncOpenAI
+                _openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    return _openai_client
+
@@ -1,21 +1,35 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from routes import docs, folders, actions, webhooks, metrics, admin
 from app.config import settings
-from app.metrics_registry import active_users_gauge, errors_total
+from app.db import get_client, close_client, ensure_core_indexes
+from app import active_users, profiler, tracing
+from app.responses import MongoJSONResponse
+from app.response_compression import CompressionMiddleware
+from app.metrics_registry import errors_total
 from prometheus_fastapi_instrumentator import Instrumentator
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
 import asyncio, time
 from app.routers import auth_routes
-from passlib.context import CryptContext
+from services.rate_limit import ensure_rate_limit_indexes
+from services.thumbnails import shutdown_pool
+from services.audit import ensure_audit_collections, rollup_forever
+from services.dispatcher import TaskDispatcher, ensure_task_indexes
+from services.trigram_index import ensure_trigram_indexes
+from services import blobs, tag_cache
+from app.auth import get_pwd_context
+from app.llm import get_openai_client
 import os
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def warm_up():
+    get_openai_client()
+    get_pwd_context()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -27,9 +41,9 @@ async def lifespan(app: FastAPI):
         yield
         return
     async def connect_mongo():
+        client = get_client()
         for attempt in range(10):
             try:
-                client = AsyncIOMotorClient(settings.MONGO_URI, serverSelectionTimeoutMS=2000)
                 await client.admin.command('ping')
                 app.mongodb_client = client
                 app.db = client[settings.DB_NAME]
@@ -40,31 +54,66 @@ async def lifespan(app: FastAPI):
                 await asyncio.sleep(2)
         print("❌ MongoDB connection failed after 10 attempts")
 
-    
-    await connect_mongo()
-
-    if app.db is not None and settings.CREATE_DEFAULT_ADMIN:
-        existing_admin = await app.db.users.find_one({"role": "admin"})
-        if not existing_admin:
-            hashed_pw = pwd_context.hash(settings.DEFAULT_ADMIN_PASSWORD)
-            await app.db.users.insert_one({
-            "email": settings.DEFAULT_ADMIN_EMAIL,
-            "password": hashed_pw,
-            "role": "admin",
-            "createdAt": datetime.now(timezone.utc),
-        })
-
-            
-        else:
-            print(f"ℹ️ Admin exists: {existing_admin.get('email')}")
+    rollup_task = None
+    tag_cache_task = None
+    dedup_task = None
+    dispatcher = None
+
+    async def prepare():
+        nonlocal rollup_task, tag_cache_task, dedup_task, dispatcher
+        await connect_mongo()
+
+        if app.db is not None:
+            await ensure_core_indexes(app.db)
+            await ensure_rate_limit_indexes(app.db)
+            await ensure_audit_collections(app.db)
+            await ensure_task_indexes(app.db)
+            await ensure_trigram_indexes(app.db)
+            await blobs.ensure_blob_indexes(app.db)
+            rollup_task = asyncio.create_task(rollup_forever(app.db))
+            tag_cache_task = asyncio.create_task(tag_cache.verify_forever(app.db))
+            if settings.GRIDFS_DEDUP:
+                dedup_task = asyncio.create_task(blobs.dedupe_forever(app.db))
+            if settings.DISPATCHER_ENABLED:
+                dispatcher = TaskDispatcher(app.db)
+                dispatcher.start()
+
+        if app.db is not None and settings.CREATE_DEFAULT_ADMIN:
+            existing_admin = await app.db.users.find_one({"role": "admin"})
+            if not existing_admin:
+                hashed_pw = get_pwd_context().hash(settings.DEFAULT_ADMIN_PASSWORD)
+                await app.db.users.insert_one({
+                "email": settings.DEFAULT_ADMIN_EMAIL,
+                "password": hashed_pw,
+                "role": "admin",
+                "createdAt": datetime.now(timezone.utc),
+            })
+            else:
+                print(f"ℹ️ Admin exists: {existing_admin.get('email')}")
+
+    startup_task = None
+    if settings.FAST_START:
+        # accept traffic immediately; /health says "client_missing" until Mongo is up
+        startup_task = asyncio.create_task(prepare())
+    else:
+        await prepare()
+    # import the deferred clients now rather than on the first OCR/login request
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    active_users_task = asyncio.create_task(active_users.refresh_forever())
 
     yield
 
+    for task in (startup_task, warm_up_task, active_users_task, rollup_task, tag_cache_task, dedup_task):
+        if task:
+            task.cancel()
+    if dispatcher:
+        await dispatcher.stop()
+    shutdown_pool()
     if app.mongodb_client:
-        app.mongodb_client.close()
+        close_client()
         print("🧹 MongoDB connection closed")
 
-app = FastAPI(title="Senior Backend Assignment", lifespan=lifespan)
+app = FastAPI(title="Senior Backend Assignment", lifespan=lifespan, default_response_class=MongoJSONResponse)
 
 ALLOWED_ORIGINS = settings.ALLOWED_ORIGINS
 
@@ -113,17 +162,44 @@ async def rate_limiter(request: Request, call_next):
 
 
 @app.middleware("http")
-async def track_active_users(request: Request, call_next):
-    user = request.headers.get("Authorization")
-    if user:
-        active_users_gauge.inc()
+async def profile_matching_requests(request: Request, call_next):
+    session = profiler.active_session
+    if session is not None and session.expired():
+        profiler.expire_session()
+        session = None
+    if session is None or not session.matches(request.url.path):
+        return await call_next(request)
+
+    session.enter()
     try:
-        response = await call_next(request)
+        return await call_next(request)
     finally:
-        if user:
-            active_users_gauge.dec()
+        session.exit()
+        if session.done:
+            profiler.finish_request_session(session)
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    if not settings.TRACING_ENABLED:
+        return await call_next(request)
+
+    trace, token = tracing.start_trace()
+    started = time.perf_counter()
+    try:
+        with tracing.span(f"{request.method} {request.url.path}"):
+            response = await call_next(request)
+    finally:
+        tracing.end_trace(token)
+
+    response.headers["Server-Timing"] = trace.server_timing(time.perf_counter() - started)
+    tracing.export(trace)
     return response
 
+# outermost of our middlewares, so it sees the final headers (Server-Timing included)
+if settings.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
 app.include_router(admin.router)
 app.include_router(auth_routes.router)
 app.include_router(docs.router)
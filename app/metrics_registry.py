@@ -1,9 +1,88 @@
 from prometheus_client import Counter, Histogram, Gauge
 
+# Under gunicorn (see gunicorn.conf.py) every worker writes its samples to
+# PROMETHEUS_MULTIPROC_DIR and /metrics merges them. Counters and histograms
+# are summed; each gauge declares how it is merged across workers.
+
 # --- Custom domain metrics ---
 ocr_requests_total = Counter("ocr_requests_total", "Total number of OCR requests received")
 upload_requests_total = Counter("upload_requests_total", "Total number of document uploads")
 webhook_calls_total = Counter("webhook_calls_total", "Total number of webhooks processed")
 db_query_latency_seconds = Histogram("db_query_latency_seconds", "Time taken for MongoDB operations")
-active_users_gauge = Gauge("active_users", "Number of currently active authenticated users")
+# every worker publishes the same cross-worker estimate (see app/active_users.py)
+active_users_gauge = Gauge(
+    "active_users", "Distinct authenticated users seen in the window (HyperLogLog estimate)", ["window"],
+    multiprocess_mode="livemax",
+)
 errors_total = Counter("app_errors_total", "Total application errors encountered")
+list_requests_total = Counter("list_requests_total", "Total number of document list requests", ["role"])
+
+# --- Search cache ---
+search_cache_lookups_total = Counter("search_cache_lookups_total", "Search cache lookups", ["result"])
+search_cache_bytes = Gauge(
+    "search_cache_bytes", "Approximate memory held by cached search results", multiprocess_mode="livesum"
+)
+search_cache_entries = Gauge("search_cache_entries", "Cached search results", multiprocess_mode="livesum")
+
+# --- Document metadata cache ---
+doc_cache_lookups_total = Counter("doc_cache_lookups_total", "Document metadata cache lookups", ["result"])
+doc_cache_bytes = Gauge(
+    "doc_cache_bytes", "Approximate memory held by cached document responses", multiprocess_mode="livesum"
+)
+doc_cache_entries = Gauge("doc_cache_entries", "Cached document responses", multiprocess_mode="livesum")
+
+# --- Tag cache ---
+tag_cache_lookups_total = Counter("tag_cache_lookups_total", "Tag id cache lookups", ["result"])
+tag_cache_stale_total = Counter(
+    "tag_cache_stale_total", "Cached tag ids found renamed or deleted by the periodic check"
+)
+
+# --- GridFS dedup ---
+gridfs_dedup_hits_total = Counter("gridfs_dedup_hits_total", "Stored files that reused an identical blob")
+gridfs_dedup_bytes_saved_total = Counter(
+    "gridfs_dedup_bytes_saved_total", "GridFS bytes not written, or freed by the sweep, thanks to dedup"
+)
+
+# --- Task dispatcher ---
+tasks_dispatched_total = Counter(
+    "tasks_dispatched_total", "Tasks processed by the dispatcher", ["channel", "outcome"]
+)
+tasks_dead_lettered_total = Counter(
+    "tasks_dead_lettered_total", "Tasks moved to dead-letter after exhausting retries", ["channel"]
+)
+task_dispatch_lag_seconds = Histogram(
+    "task_dispatch_lag_seconds", "Time from task creation to completion",
+    buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600),
+)
+# every worker polls the same queue, so the largest live reading is the freshest worst case;
+# a dead worker's last reading is dropped with its live gauge file
+task_queue_oldest_seconds = Gauge(
+    "task_queue_oldest_seconds", "Age of the oldest claimable task", multiprocess_mode="livemax"
+)
+tasks_in_flight = Gauge(
+    "tasks_in_flight", "Tasks currently leased by dispatcher workers", multiprocess_mode="livesum"
+)
+
+# --- MongoDB connection pool ---
+mongo_pool_checkout_wait_seconds = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting to check out a pooled connection", ["address"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+mongo_pool_checkout_failures_total = Counter(
+    "mongo_pool_checkout_failures_total", "Failed connection checkouts", ["address", "reason"]
+)
+mongo_pool_connections = Gauge(
+    "mongo_pool_connections", "Open pooled connections", ["address"], multiprocess_mode="livesum"
+)
+mongo_pool_in_use = Gauge(
+    "mongo_pool_in_use", "Pooled connections currently checked out", ["address"], multiprocess_mode="livesum"
+)
+
+# --- MongoDB commands ---
+mongo_command_duration_seconds = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ["command", "collection"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+mongo_command_failures_total = Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", ["command", "collection"]
+)
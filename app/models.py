@@ -42,6 +42,7 @@ class DocumentModel(MongoModel):
     gridfsId: Optional[PyObjectId] = None
     textContent: Optional[str] = None
     createdAt: datetime.datetime
+    version: int = 0  # bumped by every later write; part of the GET /v1/docs/{id} ETag
 
     class Config:
         extra = "allow"
@@ -0,0 +1,184 @@
+import sys, threading, time, uuid
+from collections import Counter
+from .config import settings
+
+MAX_FINISHED_SESSIONS = 10
+# polling for a result must not use up the profiled request slots
+PROFILER_PATH = "/admin/profile"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread (the event loop thread) from a background
+    thread every `interval` seconds and aggregates them as collapsed stacks.
+    Nothing runs while no profile is being taken, and the sampler thread exits
+    by itself once `deadline` (a time.monotonic() value) has passed.
+    """
+
+    def __init__(self, thread_ident: int, interval: float | None = None, deadline: float | None = None):
+        self.thread_ident = thread_ident
+        self.interval = interval or settings.PROFILER_INTERVAL_MS / 1000
+        self.deadline = deadline
+        self.stacks: Counter = Counter()
+        self.recording = True
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if wait and self._thread:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                break
+            if not self.recording:
+                continue
+            frame = sys._current_frames().get(self.thread_ident)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+
+    # --- Output formats ---
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name: str = "profile") -> dict:
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.stacks.most_common():
+            ids = []
+            for label in stack.split(";"):
+                if label not in index:
+                    index[label] = len(frames)
+                    func, _, location = label.partition(" (")
+                    file, _, line = location.rstrip(")").rpartition(":")
+                    frames.append({"name": func, "file": file, "line": int(line) if line.isdigit() else None})
+                ids.append(index[label])
+            samples.append(ids)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "exporter": "document-automation-service",
+        }
+
+
+class RequestProfileSession:
+    """
+    Profiles the next `remaining` requests whose path starts with `route`.
+    Samples are only kept while at least one of those requests is in flight.
+    The session ends with whatever it has after PROFILER_SESSION_TIMEOUT.
+    """
+
+    def __init__(self, route: str, requests: int, thread_ident: int):
+        self.id = uuid.uuid4().hex
+        self.route = route
+        self.remaining = requests
+        self.inflight = 0
+        self.deadline = time.monotonic() + settings.PROFILER_SESSION_TIMEOUT
+        self.profiler = SamplingProfiler(thread_ident, deadline=self.deadline)
+        self.profiler.recording = False
+        self.done = False
+        self.outcome = None  # completed | timeout | cancelled
+
+    def matches(self, path: str) -> bool:
+        return self.remaining > 0 and path.startswith(self.route) and not path.startswith(PROFILER_PATH)
+
+    def enter(self):
+        self.remaining -= 1
+        self.inflight += 1
+        self.profiler.recording = True
+
+    def exit(self):
+        self.inflight -= 1
+        if self.inflight == 0:
+            self.profiler.recording = False
+            if self.remaining <= 0 and not self.done:
+                self.end("completed")
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def end(self, outcome: str):
+        # called on the event loop, so don't wait for the sampler thread
+        self.profiler.recording = False
+        self.profiler.stop(wait=False)
+        self.outcome = outcome
+        self.done = True
+
+
+# The request middleware reads only this attribute, so it costs next to nothing when idle
+active_session: RequestProfileSession | None = None
+finished_sessions: dict[str, RequestProfileSession] = {}
+
+
+def start_request_session(route: str, requests: int) -> RequestProfileSession:
+    global active_session
+    session = RequestProfileSession(route, requests, threading.get_ident())
+    session.profiler.start()
+    active_session = session
+    return session
+
+
+def finish_request_session(session: RequestProfileSession):
+    global active_session
+    if active_session is session:
+        active_session = None
+    finished_sessions[session.id] = session
+    while len(finished_sessions) > MAX_FINISHED_SESSIONS:
+        finished_sessions.pop(next(iter(finished_sessions)))
+
+
+def expire_session():
+    """Ends the active session once it is past its deadline, whether or not its route was hit."""
+    session = active_session
+    if session is not None and session.expired():
+        if not session.done:
+            session.end("timeout")
+        finish_request_session(session)
+
+
+def cancel_session(session_id: str) -> RequestProfileSession | None:
+    """Ends the active session early, keeping the samples taken so far."""
+    session = active_session
+    if session is None or session.id != session_id:
+        return None
+    session.end("cancelled")
+    finish_request_session(session)
+    return session
+
+
+def get_session(session_id: str) -> RequestProfileSession | None:
+    expire_session()
+    if active_session is not None and active_session.id == session_id:
+        return active_session
+    return finished_sessions.get(session_id)
@@ -0,0 +1,47 @@
+from bson import ObjectId
+from fastapi.responses import JSONResponse, Response
+import hashlib, orjson
+
+# browsers keep the body but revalidate it on every use
+REVALIDATE = "private, no-cache"
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    orjson-backed JSON response that understands ObjectId and datetime natively.
+    Routes with large list payloads return this directly with raw Mongo dicts,
+    which skips FastAPI's per-item jsonable_encoder pass.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def weak_etag(*parts) -> str:
+    """Weak validator over whatever identifies the current state (ids, versions, generations)."""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison against an If-None-Match list, as required for GET."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE})
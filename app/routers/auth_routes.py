@@ -1,6 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 import jwt
 from bson import ObjectId
@@ -9,12 +8,10 @@ from app.db import get_db
 from app.utils import now
 from app.config import settings
 from app.schemas import UserClaims
-from app.auth import get_current_user
+from app.auth import get_current_user, get_pwd_context
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def create_access_token(data: dict, expires_minutes: int = 60 * 24):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
@@ -38,7 +35,7 @@ async def signup(payload: SignupRequest, db=Depends(get_db)):
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = pwd_context.hash(payload.password)
+    hashed_pw = get_pwd_context().hash(payload.password)
     user = {
         "email": payload.email,
         "password": hashed_pw,
@@ -52,7 +49,7 @@ async def signup(payload: SignupRequest, db=Depends(get_db)):
 @router.post("/login")
 async def login(payload: LoginRequest, db=Depends(get_db)):
     user = await db.users.find_one({"email": payload.email})
-    if not user or not pwd_context.verify(payload.password, user["password"]):
+    if not user or not get_pwd_context().verify(payload.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     token_data = {
@@ -773,6 +773,7 @@ async function showDocDetails(id) {
     document.getElementById("detTarget").innerText = d.unsubscribeTarget || "-";
     document.getElementById("detText").innerText =
       d.textContent || "(No OCR text found)";
+    loadThumbnail(id);
 
     // show panel
     document.getElementById("docDetailsCard").classList.remove("hidden");
@@ -782,6 +783,23 @@ async function showDocDetails(id) {
   }
 }
 
+async function loadThumbnail(id) {
+  const img = document.getElementById("detThumb");
+  img.classList.add("hidden");
+  try {
+    // small cached JPEG instead of the full original
+    const res = await fetch(`${BASE_URL}/v1/docs/${id}/thumbnail?size=256`, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    if (!res.ok) return;
+    if (img.src) URL.revokeObjectURL(img.src);
+    img.src = URL.createObjectURL(await res.blob());
+    img.classList.remove("hidden");
+  } catch (err) {
+    console.error("loadThumbnail error", err);
+  }
+}
+
 function hideDocDetails() {
   document.getElementById("docDetailsCard").classList.add("hidden");
 }
@@ -0,0 +1,214 @@
+import contextvars, json, queue, secrets, threading, time
+from contextlib import contextmanager
+from pymongo import monitoring
+from .config import settings
+from .db_monitoring import IGNORED_COMMANDS, command_collection
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: str | None, start_ns: int, attributes: dict):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.attributes = attributes
+
+    def to_otlp_json(self, trace_id: str) -> dict:
+        return {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in self.attributes.items()],
+        }
+
+
+class Trace:
+    """Spans and per-phase totals for one request."""
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[Span] = []
+        # phase -> [seconds, count]
+        self.phases: dict[str, list] = {}
+
+    def add(self, span: Span, phase: str | None):
+        self.spans.append(span)
+        if phase:
+            totals = self.phases.setdefault(phase, [0.0, 0])
+            totals[0] += (span.end_ns - span.start_ns) / 1e9
+            totals[1] += 1
+
+    def server_timing(self, total_seconds: float) -> str:
+        parts = [
+            f'{phase};dur={seconds * 1000:.2f};desc="{count}x"'
+            for phase, (seconds, count) in self.phases.items()
+        ]
+        parts.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ", ".join(parts)
+
+
+def start_trace():
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, phase: str | None = None, **attributes):
+    """
+    Times a block as a child of the current span. A no-op outside a traced request.
+    `phase` groups the duration into the request's Server-Timing header.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent.span_id if parent else None, time.time_ns(), attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter_ns()
+    try:
+        yield current
+    except Exception as e:
+        current.attributes["error"] = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = current.start_ns + (time.perf_counter_ns() - started)
+        trace.add(current, phase)
+
+
+class TracingCommandListener(monitoring.CommandListener):
+    """
+    Turns every MongoDB command issued inside a traced request into a "mongo" span.
+    Motor copies the caller's context into its executor threads, so the trace is visible here.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    def started(self, event):
+        trace = _current_trace.get()
+        if trace is None or event.command_name in IGNORED_COMMANDS:
+            return
+        parent = _current_span.get()
+        self._inflight[(event.connection_id, event.request_id)] = (
+            trace,
+            Span(
+                f"mongo.{event.command_name}",
+                parent.span_id if parent else None,
+                time.time_ns(),
+                {"db.collection": command_collection(event.command_name, event.command)},
+            ),
+        )
+
+    def _finish(self, event, failed: bool):
+        entry = self._inflight.pop((event.connection_id, event.request_id), None)
+        if entry is None:
+            return
+        trace, current = entry
+        current.end_ns = current.start_ns + event.duration_micros * 1000
+        if failed:
+            current.attributes["error"] = str(getattr(event, "failure", ""))
+        trace.add(current, "mongo")
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+# --- Exporters ---
+
+class FileSpanExporter:
+    """Appends spans as OTLP-style JSON lines from a background thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace):
+        self._queue.put([s.to_otlp_json(trace.trace_id) for s in trace.spans])
+
+    def flush(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                with open(self.path, "a", encoding="utf-8") as fh:
+                    for s in spans:
+                        fh.write(json.dumps(s) + "\n")
+            except OSError as e:
+                print("Warning: span export failed:", e)
+            finally:
+                self._queue.task_done()
+
+
+class OtlpSpanExporter:
+    """
+    Replays finished spans through the OpenTelemetry SDK and its OTLP exporter.
+    Needs `opentelemetry-sdk` and `opentelemetry-exporter-otlp`; the endpoint comes
+    from the standard OTEL_EXPORTER_OTLP_* environment variables.
+    """
+
+    def __init__(self):
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry import trace as otel_trace
+
+        provider = TracerProvider(resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self._otel_trace = otel_trace
+        self._provider = provider
+        self._tracer = provider.get_tracer("document-automation-service")
+
+    def export(self, trace: Trace):
+        contexts = {}
+        for s in sorted(trace.spans, key=lambda s: s.start_ns):
+            parent = contexts.get(s.parent_id)
+            otel_span = self._tracer.start_span(
+                s.name, context=parent, start_time=s.start_ns, attributes={k: str(v) for k, v in s.attributes.items()}
+            )
+            contexts[s.span_id] = self._otel_trace.set_span_in_context(otel_span)
+            otel_span.end(end_time=s.end_ns)
+
+    def flush(self):
+        self._provider.force_flush()
+
+
+_exporter = None
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None and settings.TRACING_EXPORTER == "file":
+        _exporter = FileSpanExporter(settings.TRACING_FILE)
+    elif _exporter is None and settings.TRACING_EXPORTER == "otlp":
+        _exporter = OtlpSpanExporter()
+    return _exporter
+
+
+def export(trace: Trace):
+    exporter = get_exporter()
+    if exporter is not None and trace.spans:
+        exporter.export(trace)
@@ -0,0 +1,75 @@
+"""
+Streaming ZIP throughput and peak memory for a large folder.
+
+    python -m benchmarks.bench_folder_archive [files] [file_kb]
+
+Feeds stream_zip with in-memory 255 KB chunks (the GridFS chunk size) and
+compares it with building the whole archive in a BytesIO first, which is
+what a naive implementation of the archive endpoint would do.
+"""
+import asyncio, io, os, sys, time, tracemalloc, zipfile
+from datetime import datetime
+from services.archive import stream_zip
+
+CHUNK_SIZE = 255 * 1024
+
+
+def make_blobs(files: int, file_kb: int) -> list[bytes]:
+    # half random (incompressible, like images), half repetitive text
+    return [
+        os.urandom(file_kb * 1024) if i % 2 else (b"invoice line %d\n" % i) * (file_kb * 1024 // 16)
+        for i in range(files)
+    ]
+
+
+async def entries(blobs):
+    async def chunks(data):
+        for i in range(0, len(data), CHUNK_SIZE):
+            yield data[i:i + CHUNK_SIZE]
+
+    for i, data in enumerate(blobs):
+        yield f"scan-{i:05d}.bin", datetime(2024, 1, 1), len(data), chunks(data)
+
+
+async def streamed(blobs, mode):
+    total = 0
+    async for part in stream_zip(entries(blobs), mode):
+        total += len(part)
+    return total
+
+
+def buffered(blobs, mode):
+    buf = io.BytesIO()
+    compression = zipfile.ZIP_DEFLATED if mode == "deflate" else zipfile.ZIP_STORED
+    with zipfile.ZipFile(buf, "w", compression=compression) as zf:
+        for i, data in enumerate(blobs):
+            zf.writestr(f"scan-{i:05d}.bin", data)
+    return len(buf.getvalue())
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+if __name__ == "__main__":
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    file_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    blobs = make_blobs(files, file_kb)
+    source_mb = files * file_kb / 1024
+    print(f"{files} files x {file_kb} KB ({source_mb:.0f} MB)")
+    for mode in ("store", "deflate"):
+        for label, fn in (
+            ("streamed", lambda: asyncio.run(streamed(blobs, mode))),
+            ("buffered", lambda: buffered(blobs, mode)),
+        ):
+            size, elapsed, peak = measure(fn)
+            print(
+                f"  {mode:<7} {label:<8} {elapsed * 1000:8.0f} ms  {source_mb / elapsed:7.1f} MB/s"
+                f"  archive {size / 2**20:7.1f} MB  peak extra memory {peak / 2**20:7.1f} MB"
+            )
@@ -0,0 +1,60 @@
+"""
+Serialization cost of a 10k-document list response.
+
+    python -m benchmarks.bench_serialization [count]
+
+Compares the old path (per-item ObjectId -> str loop, jsonable_encoder,
+stdlib json via JSONResponse) with MongoJSONResponse on raw Mongo dicts.
+"""
+import sys, time
+from datetime import datetime, timezone, timedelta
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.responses import MongoJSONResponse
+
+
+def make_docs(count: int) -> list[dict]:
+    base = datetime.now(timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "filename": f"scan-{i:05d}.png",
+            "mime": "image/png",
+            "ownerId": f"user{i % 50}",
+            "createdAt": base - timedelta(minutes=i),
+            "tags": ["invoice", "finance", f"vendor-{i % 17}"],
+        }
+        for i in range(count)
+    ]
+
+
+def old_path(docs):
+    converted = []
+    for d in docs:
+        d = dict(d)
+        d["_id"] = str(d["_id"])
+        converted.append(d)
+    return JSONResponse(jsonable_encoder(converted)).body
+
+
+def new_path(docs):
+    return MongoJSONResponse(docs).body
+
+
+def best_of(fn, docs, repeat=5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    docs = make_docs(count)
+    old = best_of(old_path, docs)
+    new = best_of(new_path, docs)
+    print(f"{count} docs  jsonable_encoder+json: {old * 1000:8.2f} ms")
+    print(f"{count} docs  MongoJSONResponse:    {new * 1000:8.2f} ms  ({old / new:.1f}x faster)")
@@ -0,0 +1,73 @@
+"""
+Cold-start budget: import time of app.main and time until /health answers.
+
+    python -m benchmarks.bench_startup [--runs 5] [--import-budget-ms 700] [--ready-budget-ms 1000]
+
+Every run is a fresh interpreter. Readiness is measured from spawning
+uvicorn with FAST_START=1 to the first 200 from /health, so it does not
+depend on MongoDB being reachable. Exits non-zero when a median exceeds its
+budget, so CI can use it as a regression gate. Needs the same environment as
+the app (JWT_SECRET, OPENAI_API_KEY, ...).
+"""
+import argparse, os, socket, statistics, subprocess, sys, time, urllib.request
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def import_seconds() -> float:
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", IMPORT_SNIPPET], check=True, capture_output=True, text=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def ready_seconds(timeout: float = 30.0) -> float:
+    port = free_port()
+    env = {**os.environ, "FAST_START": "1"}
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("/health did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget-ms", type=float, default=700)
+    parser.add_argument("--ready-budget-ms", type=float, default=1000)
+    args = parser.parse_args()
+
+    imports = [import_seconds() * 1000 for _ in range(args.runs)]
+    readies = [ready_seconds() * 1000 for _ in range(args.runs)]
+
+    failed = False
+    for label, samples, budget in (
+        ("import app.main", imports, args.import_budget_ms),
+        ("first healthy /health", readies, args.ready_budget_ms),
+    ):
+        median = statistics.median(samples)
+        ok = median <= budget
+        failed |= not ok
+        print(f"{label:<22} median {median:7.1f} ms  min {min(samples):7.1f} ms  budget {budget:.0f} ms  {'ok' if ok else 'OVER BUDGET'}")
+    sys.exit(1 if failed else 0)
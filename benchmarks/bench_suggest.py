@@ -0,0 +1,55 @@
+"""
+Suggestion latency for one tenant with many documents. Needs a MongoDB at MONGO_URI.
+
+    python -m benchmarks.bench_suggest [documents]
+
+Indexes `documents` synthetic filenames/tags for one owner into a scratch
+database through the same write path as uploads, then times suggest().
+"""
+import asyncio, random, statistics, sys, time
+from app.db import create_client
+from services.trigram_index import ensure_trigram_indexes, suggest, _term_updates
+
+WORDS = [
+    "invoice", "receipt", "statement", "contract", "payslip", "scan", "img", "report",
+    "summary", "tax", "quote", "order", "delivery", "letter", "policy", "claim",
+]
+VENDORS = [f"vendor{i}" for i in range(2000)]
+TAGS = ["finance", "travel", "unpaid", "tax", "customer", "legal", "hr", "medical"]
+QUERIES = ["inv", "invoce", "recipt", "vendor12", "fin", "contrct", "paysl", "vendr999"]
+
+
+async def main(count: int):
+    client = create_client()
+    db = client["bench_suggest"]
+    await db.suggest_terms.drop()
+    await ensure_trigram_indexes(db)
+
+    rng = random.Random(1)
+    batch = []
+    for i in range(count):
+        name = f"{rng.choice(WORDS)}_{rng.choice(VENDORS)}_{i:06d}.png"
+        batch += _term_updates("tenant", name, [rng.choice(TAGS)])
+        if len(batch) >= 5000:
+            await db.suggest_terms.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.suggest_terms.bulk_write(batch, ordered=False)
+    terms = await db.suggest_terms.count_documents({})
+    print(f"{count} documents -> {terms} distinct terms")
+
+    for q in QUERIES:
+        samples = []
+        for _ in range(20):
+            start = time.perf_counter()
+            result = await suggest(db, "tenant", q)
+            samples.append((time.perf_counter() - start) * 1000)
+        top = result[0]["term"] if result else "-"
+        print(f"  {q:<10} median {statistics.median(samples):6.2f} ms  p95 {sorted(samples)[18]:6.2f} ms  top={top}")
+
+    await client.drop_database("bench_suggest")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500_000))
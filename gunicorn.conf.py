@@ -0,0 +1,33 @@
+"""
+Multi-worker entry point:
+
+    gunicorn app.main:app
+
+Runs WEB_CONCURRENCY uvicorn workers (default: one per core) behind one
+socket. Prometheus runs in multiprocess mode: every worker writes its
+samples under PROMETHEUS_MULTIPROC_DIR and /metrics merges them, whichever
+worker answers the scrape.
+"""
+import multiprocessing, os, shutil, tempfile
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn_worker.UvicornWorker"
+graceful_timeout = 30
+
+# must be in the environment before any worker imports prometheus_client
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "prometheus-multiproc"))
+
+
+def on_starting(server):
+    # files left by a previous run would be merged into the new counters
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    # drops the dead worker's live gauges; its counters stay in the totals
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -2,25 +2,27 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from app.auth import get_current_user, require_role
 from app.db import get_db
+from services.audit import log_event
+from app.tracing import span
 from app.utils import now
 from app.schemas import ActionRequest
 from bson import ObjectId
 import csv, io, datetime, time, base64
 from app.metrics_registry import db_query_latency_seconds, errors_total
 from app.config import settings
-from openai import AsyncOpenAI
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from app.llm import get_openai_client
 from services.usage import get_monthly_usage, charge_user, get_remaining_credits, DEFAULT_CREDIT_LIMIT
+from services import blobs, compression, generations, metrics_rollup, tag_cache, trigram_index
 
 router = APIRouter(prefix="/v1/actions", tags=["actions"])
-openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 async def run_openai_agent(prompt: str, mode: str) -> str:
     try:
-        response = await openai_client.responses.create(
-            model="gpt-4o-mini",
-            input=[{"role": "user", "content": [{"type": "input_text", "text": prompt}]}],
-        )
+        with span("openai.responses", phase="openai", mode=mode):
+            response = await get_openai_client().responses.create(
+                model="gpt-4o-mini",
+                input=[{"role": "user", "content": [{"type": "input_text", "text": prompt}]}],
+            )
         output_text = ""
         for item in response.output:
             if item.type == "message":
@@ -37,7 +39,7 @@ async def run_openai_agent(prompt: str, mode: str) -> str:
 async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=Depends(get_db)):
     # db = get_db()
 
-    remaining = await get_remaining_credits(user.sub)
+    remaining = await get_remaining_credits(user.sub, db=db)
     if remaining <= 0:
         raise HTTPException(status_code=402, detail="Credit limit reached. Please upgrade or wait for next month reset.")
     
@@ -52,17 +54,13 @@ async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=
     # --- Collect docs in scope ---
     if scope.type == "folder":
         # Fetch tag for folder name
-        tag_filter = {"name": scope.name}
-        if user.role != "admin":
-            tag_filter["ownerId"] = user.sub
-
-        tag = await db.tags.find_one(tag_filter)
-        if not tag:
+        tag_id = await tag_cache.resolve(db, None if user.role == "admin" else user.sub, scope.name)
+        if not tag_id:
             raise HTTPException(status_code=404, detail="Folder/tag not found")
 
         # Get documents linked to that tag (primary only)
         doc_tags = await db.document_tags.find({
-            "tagId": tag["_id"],
+            "tagId": tag_id,
             "isPrimary": True
         }).to_list(None)
 
@@ -75,16 +73,11 @@ async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=
 
 
     elif scope.type == "tag":
-        tag_filter = {"name": scope.name}
-        if user.role != "admin":  # Only restrict normal users
-            tag_filter["ownerId"] = user.sub
-
-        tag = await db.tags.find_one(tag_filter)
-        if not tag:
+        # Only restrict normal users
+        tag_id = await tag_cache.resolve(db, None if user.role == "admin" else user.sub, scope.name)
+        if not tag_id:
             raise HTTPException(status_code=404, detail="Tag not found")
 
-        tag_id = tag["_id"]
-
         # Now fetch all docs linked to that tag (primary or secondary)
         doc_tags = await db.document_tags.find({
             "$or": [
@@ -120,7 +113,7 @@ async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=
     context_parts = []
     for d in docs:
         filename = d.get("filename", "unknown")
-        text = (d.get("textContent") or "").strip()
+        text = (compression.unpack_text(d).get("textContent") or "").strip()
         context_parts.append(f"📄 File: {filename}\n{text[:1200]}")
     context_text = "\n\n".join(context_parts)
 
@@ -141,7 +134,6 @@ async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=
         csv_prompt = full_prompt + "\n\nOutput a CSV with headers summarizing key totals or data."
         csv_output = await run_openai_agent(csv_prompt, "make_csv")
 
-    fs = AsyncIOMotorGridFSBucket(db)
     response_payload = {
         "message": "OpenAI Actions executed successfully",
         "credits_used": settings.CREDITS_PER_ACTION,
@@ -153,13 +145,10 @@ async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=
     if text_output:
         filename_txt = f"summary_{scope.name or 'scope'}.txt"
         text_bytes = text_output.encode("utf-8")
-        upload_stream = fs.open_upload_stream(
-            filename_txt,
-            metadata={"ownerId": user.sub, "contentType": "text/plain"},
-        )
-        await upload_stream.write(text_bytes)
-        await upload_stream.close()
-        gridfs_id = upload_stream._id
+        with span("gridfs.write", phase="gridfs", bytes=len(text_bytes)):
+            gridfs_id = await blobs.store(
+                db, text_bytes, filename_txt, {"ownerId": user.sub, "contentType": "text/plain"}
+            )
 
         result = await db.documents.insert_one({
             "ownerId": user.sub,
@@ -169,6 +158,7 @@ async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=
             "createdAt": now(),
         })
         doc_id = str(result.inserted_id)
+        await trigram_index.index_document(db, user.sub, filename_txt)
         response_payload["new_docs"].append(doc_id)
         response_payload["downloads"]["text"] = f"/v1/docs/{doc_id}/download"
 
@@ -176,13 +166,10 @@ async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=
     if csv_output:
         filename_csv = f"report_{scope.name or 'scope'}.csv"
         csv_bytes = csv_output.encode("utf-8")
-        upload_stream = fs.open_upload_stream(
-            filename_csv,
-            metadata={"ownerId": user.sub, "contentType": "text/csv"},
-        )
-        await upload_stream.write(csv_bytes)
-        await upload_stream.close()
-        gridfs_id = upload_stream._id
+        with span("gridfs.write", phase="gridfs", bytes=len(csv_bytes)):
+            gridfs_id = await blobs.store(
+                db, csv_bytes, filename_csv, {"ownerId": user.sub, "contentType": "text/csv"}
+            )
         result = await db.documents.insert_one({
             "ownerId": user.sub,
             "filename": filename_csv,
@@ -191,11 +178,12 @@ async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=
             "createdAt": now(),
         })
         doc_id = str(result.inserted_id)
+        await trigram_index.index_document(db, user.sub, filename_csv)
         response_payload["new_docs"].append(doc_id)
         response_payload["downloads"]["csv"] = f"/v1/docs/{doc_id}/download"
 
     # --- Audit log ---
-    await db.audit_logs.insert_one({
+    await log_event(db, {
         "at": now(),
         "userId": user.sub,
         "action": "run_actions",
@@ -206,7 +194,10 @@ async def run_actions(payload: ActionRequest, user=Depends(get_current_user),db=
             "newDocs": response_payload["new_docs"],
         },
     })
-    await charge_user(str(user.sub), settings.CREDITS_PER_ACTION)
+    await metrics_rollup.record(db, user.sub, docs=len(response_payload["new_docs"]), actions=1)
+    if response_payload["new_docs"]:
+        await generations.bump(db, user.sub)
+    await charge_user(str(user.sub), settings.CREDITS_PER_ACTION, db=db)
     return response_payload
 
 @router.get("/usage/month", dependencies=[Depends(require_role("user", "admin"))])
@@ -223,18 +214,18 @@ async def usage_month(user=Depends(get_current_user),db=Depends(get_db)):
     return result[0] if result else {"userId": user.sub, "total_credits": 0}
 
 @router.get("/usage/{user_id}", dependencies=[Depends(require_role("admin"))])
-async def get_user_usage(user_id: str):
+async def get_user_usage(user_id: str, db=Depends(get_db)):
     """
     Returns total credits used by a user for the current month.
     Only accessible to admins.
     """
-    total = await get_monthly_usage(user_id)
+    total = await get_monthly_usage(user_id, db=db)
     return {"userId": user_id, "total_credits": total}
 
 @router.get("/usage", summary="Get current user’s credit usage")
-async def get_usage(user=Depends(get_current_user)):
-    used = await get_monthly_usage(user.sub)
-    remaining = await get_remaining_credits(user.sub)
+async def get_usage(user=Depends(get_current_user), db=Depends(get_db)):
+    used = await get_monthly_usage(user.sub, db=db)
+    remaining = await get_remaining_credits(user.sub, db=db)
     return {
         "used": used,
         "remaining": remaining,
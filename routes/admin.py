@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from bson import ObjectId
 from datetime import datetime, timezone
+import asyncio, threading
 
 from app.db import get_db
+from services.audit import log_event
 from app.auth import require_role, get_current_user
+from app import profiler
+from app.responses import MongoJSONResponse
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -16,16 +21,16 @@ async def list_all_users(db=Depends(get_db)):
     List all users (admin only).
     """
     # db = get_db()
-    users = await db.users.find({}, {"email": 1, "role": 1, "createdAt": 1}).to_list(None)
-    return [
-        {
-            "id": str(u["_id"]),
-            "email": u["email"],
-            "role": u.get("role", "user"),
-            "createdAt": u.get("createdAt"),
-        }
-        for u in users
-    ]
+    users = await db.users.aggregate([
+        {"$project": {
+            "_id": 0,
+            "id": "$_id",
+            "email": 1,
+            "role": {"$ifNull": ["$role", "user"]},
+            "createdAt": 1,
+        }},
+    ]).to_list(None)
+    return MongoJSONResponse(users)
 
 
 @router.post("/users/{user_id}/role", dependencies=[Depends(require_role("admin"))])
@@ -45,7 +50,7 @@ async def change_user_role(user_id: str, new_role: str, admin=Depends(get_curren
 
     await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": {"role": new_role}})
 
-    await db.audit_logs.insert_one({
+    await log_event(db, {
         "action": "change_user_role",
         "performedBy": str(admin.sub),
         "targetUser": user_id,
@@ -55,3 +60,61 @@ async def change_user_role(user_id: str, new_role: str, admin=Depends(get_curren
 
     return {"message": f"User {user['email']} role updated to {new_role}"}
 
+
+
+def _render_profile(prof: profiler.SamplingProfiler, fmt: str, name: str):
+    if fmt == "speedscope":
+        return prof.speedscope(name)
+    return PlainTextResponse(prof.collapsed())
+
+
+@router.post("/profile", dependencies=[Depends(require_role("admin"))])
+async def start_profile(
+    seconds: float | None = Query(None, gt=0, le=60, description="Profile the worker for N seconds"),
+    requests: int | None = Query(None, gt=0, le=1000, description="Profile the next N matching requests"),
+    route: str = Query("/", description="Path prefix the profiled requests must match"),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+):
+    """
+    Samples the event loop thread of this worker.
+    - `seconds`: blocks for that long and returns the profile.
+    - `requests` + `route`: returns a session id; fetch the result from GET /admin/profile/{id}.
+    """
+    if (seconds is None) == (requests is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of 'seconds' or 'requests'")
+
+    if seconds is not None:
+        prof = profiler.SamplingProfiler(threading.get_ident())
+        prof.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            prof.stop(wait=False)
+        return _render_profile(prof, format, f"{seconds}s")
+
+    profiler.expire_session()
+    if profiler.active_session is not None:
+        raise HTTPException(status_code=409, detail="A request profile is already running")
+    session = profiler.start_request_session(route, requests)
+    return {"id": session.id, "status": "running", "route": route, "requests": requests}
+
+
+@router.get("/profile/{session_id}", dependencies=[Depends(require_role("admin"))])
+async def get_profile(session_id: str, format: str = Query("collapsed", pattern="^(collapsed|speedscope)$")):
+    session = profiler.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Profile session not found")
+    if not session.done:
+        return JSONResponse({"status": "running", "remaining": session.remaining}, status_code=202)
+    return _render_profile(session.profiler, format, f"{session.route} x{session.profiler.stacks.total()}")
+
+
+@router.delete("/profile/{session_id}", dependencies=[Depends(require_role("admin"))])
+async def cancel_profile(session_id: str):
+    """Stops a running request profile; its samples so far stay available from GET."""
+    session = profiler.cancel_session(session_id)
+    if not session:
+        if profiler.get_session(session_id):
+            raise HTTPException(status_code=409, detail="Profile session already finished")
+        raise HTTPException(status_code=404, detail="Profile session not found")
+    return {"id": session.id, "status": session.outcome, "remaining": session.remaining}
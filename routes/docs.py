@@ -1,40 +1,42 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Form
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, HTTPException, Query, Form, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from bson import ObjectId
 from app.auth import get_current_user, require_role
 from app.db import get_db
+from services.audit import log_event
+from app.tracing import span
+from app.responses import MongoJSONResponse, REVALIDATE, etag_matches, not_modified, weak_etag
 from app.utils import now
 from app.config import settings
-from app.models import DocumentModel, TagModel, TaskModel, AuditLogModel
+from app.models import DocumentModel, TaskModel, AuditLogModel
 from app.metrics_registry import (
     upload_requests_total,
     db_query_latency_seconds,
     ocr_requests_total,
     errors_total,
+    list_requests_total,
 )
 from motor.motor_asyncio import AsyncIOMotorGridFSBucket
-from openai import AsyncOpenAI
+from app.llm import get_openai_client
 from services.ocr_classifier import classify_text, extract_unsubscribe
+from services.rate_limit import daily_key, consume_quota
+from services import blobs, compression, doc_cache, generations, metrics_rollup, search_cache, tag_cache, trigram_index
+from services.export import EXPORT_FIELDS, parse_fields, build_pipeline, stream_rows
+from services.thumbnails import THUMBNAIL_MIME, THUMBNAIL_MIMES, THUMBNAIL_SIZES, generate_thumbnails
 import io, base64, os, time
-from datetime import datetime, timezone
-from prometheus_client import Counter
+from datetime import datetime
 from bson import ObjectId
-from pymongo import ReturnDocument
 
 router = APIRouter(prefix="/v1/docs", tags=["docs"])
-openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10 MB
 ALLOWED_MIMES = {"image/png", "image/jpeg"}
 
-list_requests_total = Counter(
-    "list_requests_total", "Total number of document list requests", ["role"]
-)
-
 @router.post(
     "", summary="Upload document", dependencies=[Depends(require_role("user", "admin"))]
 )
 async def upload_doc(
+    background_tasks: BackgroundTasks,
     primaryTag: str = Form(...),
     secondaryTags: str = Form(None),
     file: UploadFile = File(...),
@@ -43,7 +45,6 @@ async def upload_doc(
 ):
     upload_requests_total.inc()
     # db = get_db()
-    fs = AsyncIOMotorGridFSBucket(db)
 
     file_bytes = await file.read()
     if not primaryTag.strip():
@@ -57,12 +58,10 @@ async def upload_doc(
     if file.content_type not in ALLOWED_MIMES:
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
-    upload_stream = fs.open_upload_stream(
-        file.filename, metadata={"ownerId": user.sub, "contentType": file.content_type}
-    )
-    await upload_stream.write(file_bytes)
-    await upload_stream.close()
-    file_id = upload_stream._id
+    with span("gridfs.write", phase="gridfs", bytes=len(file_bytes)):
+        file_id = await blobs.store(
+            db, file_bytes, file.filename, {"ownerId": user.sub, "contentType": file.content_type}
+        )
 
     start = time.time()
     doc = DocumentModel(
@@ -77,30 +76,20 @@ async def upload_doc(
     db_query_latency_seconds.observe(time.time() - start)
     doc_id = result.inserted_id
 
-    tag = await db.tags.find_one({"ownerId": user.sub, "name": primaryTag})
-    if not tag:
-        tag_doc = TagModel(name=primaryTag, ownerId=user.sub, createdAt=now())
-        tag_result = await db.tags.insert_one(tag_doc.model_dump(by_alias=True))
-        tag_id = tag_result.inserted_id
-    else:
-        tag_id = tag["_id"]
+    tag_id, created = await tag_cache.get_or_create(db, user.sub, primaryTag)
+    new_tags = int(created)
 
     await db.document_tags.insert_one(
         {"documentId": doc_id, "tagId": tag_id, "isPrimary": True}
     )
 
-    if secondaryTags:
-        for tname in [t.strip() for t in secondaryTags.split(",") if t.strip()]:
-            existing = await db.tags.find_one({"ownerId": user.sub, "name": tname})
-            if not existing:
-                sec_tag = TagModel(name=tname, ownerId=user.sub, createdAt=now())
-                tr = await db.tags.insert_one(sec_tag.model_dump(by_alias=True))
-                tid = tr.inserted_id
-            else:
-                tid = existing["_id"]
-            await db.document_tags.insert_one(
-                {"documentId": doc_id, "tagId": tid, "isPrimary": False}
-            )
+    secondary_names = [t.strip() for t in secondaryTags.split(",") if t.strip()] if secondaryTags else []
+    for tname in secondary_names:
+        tid, created = await tag_cache.get_or_create(db, user.sub, tname)
+        new_tags += created
+        await db.document_tags.insert_one(
+            {"documentId": doc_id, "tagId": tid, "isPrimary": False}
+        )
 
     audit = AuditLogModel(
         userId=user.sub,
@@ -110,7 +99,11 @@ async def upload_doc(
         metadata={"filename": file.filename, "gridfsId": str(file_id)},
         at=now(),
     )
-    await db.audit_logs.insert_one(audit.model_dump(by_alias=True))
+    await log_event(db, audit.model_dump(by_alias=True))
+    await metrics_rollup.record(db, user.sub, docs=1, folders=new_tags)
+    await trigram_index.index_document(db, user.sub, file.filename, [primaryTag, *secondary_names])
+    await generations.bump(db, user.sub)
+    background_tasks.add_task(generate_thumbnails, db, doc_id, file_bytes)
 
     return {"id": str(doc_id), "message": "File uploaded successfully to GridFS"}
 
@@ -131,6 +124,17 @@ async def search_documents(
     if not q_lower:
         raise HTTPException(status_code=400, detail="Search query cannot be empty")
 
+    # --- Result cache, valid until the owner's next document/tag write ---
+    cache_owner = None if user.role == "admin" else user.sub
+    cache_key = search_cache.make_key(cache_owner, q_lower, scope, ids)
+    generation = await generations.current(db, cache_owner)
+    cached = search_cache.get(cache_key, generation)
+    if cached:
+        status, body = cached
+        if status == 404:
+            raise HTTPException(status_code=404, detail=body)
+        return Response(body, media_type="application/json")
+
     # --- RBAC filter ---
     base_filter = {}
     if user.role != "admin":
@@ -171,6 +175,8 @@ async def search_documents(
                 "filename": 1,
                 "mime": 1,
                 "textContent": 1,
+                "textContentZ": 1,
+                "textContentEncoding": 1,
                 "createdAt": 1,
                 "tags": "$tags_info.name",
             }
@@ -181,18 +187,20 @@ async def search_documents(
     print(f"[search] Found {len(docs)} documents after lookup")
 
     if not docs:
+        search_cache.put(cache_key, generation, 404, "No documents found for this user")
         raise HTTPException(status_code=404, detail="No documents found for this user")
 
     # --- In-memory filter for text, filename, and tag matches ---
     results = []
     for d in docs:
+        compression.unpack_text(d)
         filename = (d.get("filename") or "").lower()
         text = (d.get("textContent") or "").lower()
         tags = [t.lower() for t in d.get("tags", [])]
 
         if q_lower in filename or q_lower in text or any(q_lower in t for t in tags):
             results.append({
-                "id": str(d["_id"]),
+                "id": d["_id"],
                 "filename": d.get("filename"),
                 "mime": d.get("mime"),
                 "tags": d.get("tags", []),
@@ -203,76 +211,147 @@ async def search_documents(
     print(f"[search] Matched {len(results)} results for query='{q_lower}'")
 
     if not results:
+        search_cache.put(cache_key, generation, 404, "No documents found for search query")
         raise HTTPException(status_code=404, detail="No documents found for search query")
 
-    return results
+    response = MongoJSONResponse(results)
+    search_cache.put(cache_key, generation, 200, response.body)
+    return response
 
 @router.get(
-    "/{id}",
-    summary="Get a specific document metadata",
-    dependencies=[Depends(require_role("user", "admin", "support", "moderator"))],
+    "/suggest",
+    summary="Typo-tolerant suggestions from filename words and tag names",
+    dependencies=[Depends(require_role("user", "admin", "support"))],
 )
+async def suggest_terms(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    user=Depends(get_current_user),
+    db=Depends(get_db),
+):
+    """
+    Answers from the trigram index only, never from the documents themselves.
+    Partial words ("inv") and typos ("invoce") both match "invoice".
+    Admins get suggestions across all owners.
+    """
+    owner_id = None if user.role == "admin" else user.sub
+    return MongoJSONResponse(await trigram_index.suggest(db, owner_id, q, limit))
 
+@router.get(
+    "/export",
+    summary="Stream document metadata as CSV or NDJSON",
+    dependencies=[Depends(require_role("user", "admin", "support"))],
+)
+async def export_docs(
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    fields: str | None = Query(None, description=f"Comma-separated subset of: {', '.join(EXPORT_FIELDS)}"),
+    created_from: datetime | None = Query(None, alias="from"),
+    created_to: datetime | None = Query(None, alias="to"),
+    user=Depends(get_current_user),
+    db=Depends(get_db),
+):
+    """
+    Streams every visible document straight from a Mongo cursor.
+    Same visibility as list_docs: users get their own documents, admin/support all of them.
+    """
+    try:
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/{id}", dependencies=[Depends(require_role("user", "admin", "support", "moderator"))])
-async def get_doc(id: str, user=Depends(get_current_user), db=Depends(get_db)):
+    match = {}
+    if user.role == "user":
+        match["ownerId"] = user.sub
+    if created_from or created_to:
+        match["createdAt"] = {}
+        if created_from:
+            match["createdAt"]["$gte"] = created_from
+        if created_to:
+            match["createdAt"]["$lt"] = created_to
+
+    await log_event(db, {
+        "at": now(),
+        "userId": user.sub,
+        "action": "export_docs",
+        "entityType": "document",
+        "metadata": {"format": format, "fields": selected},
+    })
 
-    if not ObjectId.is_valid(id):
-        raise HTTPException(400, "Invalid document ID")
+    cursor = db.documents.aggregate(
+        build_pipeline(match, selected), batchSize=settings.EXPORT_BATCH_SIZE, allowDiskUse=True
+    )
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_rows(cursor, selected, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="documents.{format}"'},
+    )
 
-    doc_id = ObjectId(id)
 
-    pipeline = [
-        {"$match": {"_id": doc_id}},
+DOC_FIELDS = {
+    "ownerId": 1, "filename": 1, "mime": 1, "textContent": 1, "textContentZ": 1, "textContentEncoding": 1,
+    "classification": 1, "unsubscribeTarget": 1, "gridfsId": 1, "createdAt": 1, "version": 1,
+}
 
-        # Fix: convert _id → string before lookup
-        {
-            "$lookup": {
-                "from": "document_tags",
-                "let": {"docIdString": {"$toString": "$_id"}},
-                "pipeline": [
-                    { "$match": { "$expr": { "$eq": ["$documentId", "$$docIdString"] }}}
-                ],
-                "as": "docTags"
-            }
-        },
-        {
-            "$lookup": {
-                "from": "tags",
-                "localField": "docTags.tagId",
-                "foreignField": "_id",
-                "as": "tags"
-            }
-        },
-        {
-            "$project": {
-                "_id": {"$toString": "$_id"},
-                "ownerId": 1,
-                "filename": 1,
-                "mime": 1,
-                "textContent": 1,
-                "classification": 1,
-                "unsubscribeTarget": 1,
-                "gridfsId": {"$toString": "$gridfsId"},
-                "createdAt": 1,
-                "tags": "$tags.name"
-            }
-        }
-    ]
 
-    result = await db.documents.aggregate(pipeline).to_list(1)
-    if not result:
-        raise HTTPException(404, "Document not found")
-
-    doc = result[0]
+@router.get(
+    "/{id}",
+    summary="Get a specific document metadata",
+    dependencies=[Depends(require_role("user", "admin", "support", "moderator"))],
+)
+async def get_doc(id: str, request: Request, user=Depends(get_current_user), db=Depends(get_db)):
+    """
+    Rendered responses are cached per document until the owner's generation
+    moves (any document or tag write), so a hit is one generation read.
+    A miss is a primary-key read plus two indexed reads for the tags.
+    """
+    if not ObjectId.is_valid(id):
+        raise HTTPException(400, "Invalid document ID")
 
+    doc_id = ObjectId(id)
+    if_none_match = request.headers.get("if-none-match")
+
+    # only owners and admins may read a document, so for everyone else the owner is known upfront
+    owner = doc_cache.owner_of(id) or (user.sub if user.role != "admin" else None)
+    # read before the document, so a cached body can only be older than its generation
+    generation = await generations.current(db, owner) if owner else None
+    cached = doc_cache.get(id, generation) if owner else None
+    if cached:
+        cached_owner, etag, body = cached
+        if cached_owner != user.sub and user.role != "admin":
+            raise HTTPException(403, "Forbidden")
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+    doc = await db.documents.find_one({"_id": doc_id}, DOC_FIELDS)
+    if not doc:
+        raise HTTPException(404, "Document not found")
     if doc["ownerId"] != user.sub and user.role != "admin":
         raise HTTPException(403, "Forbidden")
 
-    if isinstance(doc["createdAt"], datetime):
+    etag = weak_etag(id, doc.pop("version", 0))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    # links store documentId as an ObjectId (upload) or its string (OCR scan)
+    links = await db.document_tags.find({"documentId": {"$in": [doc_id, id]}}, {"tagId": 1}).to_list(None)
+    tag_ids = [link["tagId"] for link in links]
+    names = {t["_id"]: t["name"] async for t in db.tags.find({"_id": {"$in": tag_ids}}, {"name": 1})}
+
+    compression.unpack_text(doc)
+    gridfs_id = doc.get("gridfsId")
+    doc.update(
+        _id=id,
+        gridfsId=str(gridfs_id) if gridfs_id is not None else None,
+        tags=[names[t] for t in tag_ids if t in names],
+    )
+    if isinstance(doc.get("createdAt"), datetime):
         doc["createdAt"] = doc["createdAt"].isoformat()
 
-    return doc
+    response = MongoJSONResponse(doc, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+    doc_cache.put(id, doc["ownerId"], generation if owner == doc["ownerId"] else None, etag, response.body)
+    return response
 
 
 
@@ -281,7 +360,7 @@ async def get_doc(id: str, user=Depends(get_current_user), db=Depends(get_db)):
     summary="Download the document",
     dependencies=[Depends(require_role("user", "admin"))],
 )
-async def download_doc(id: str, user=Depends(get_current_user),db=Depends(get_db)):
+async def download_doc(id: str, request: Request, user=Depends(get_current_user),db=Depends(get_db)):
     # db = get_db()
     doc_data = await db.documents.find_one({"_id": ObjectId(id)})
     if not doc_data:
@@ -294,21 +373,86 @@ async def download_doc(id: str, user=Depends(get_current_user),db=Depends(get_db
     if isinstance(gridfs_id, str):
         gridfs_id = ObjectId(gridfs_id)
 
-    download_stream = await fs.open_download_stream(gridfs_id)
-    file_data = await download_stream.read()
+    with span("gridfs.read", phase="gridfs"):
+        download_stream = await fs.open_download_stream(gridfs_id)
+        file_data = await download_stream.read()
+
+    headers = {"Content-Disposition": f'attachment; filename="{doc_data["filename"]}"'}
+    # text may be stored compressed: pass it through when the client can decode it
+    encoding = (download_stream.metadata or {}).get("contentEncoding")
+    if encoding:
+        headers["Vary"] = "Accept-Encoding"
+        if compression.accepts(request.headers.get("accept-encoding"), encoding):
+            headers["Content-Encoding"] = encoding
+        else:
+            file_data = compression.decompress(file_data, encoding)
 
     return StreamingResponse(
         io.BytesIO(file_data),
         media_type=doc_data.get("mime", "application/octet-stream"),
-        headers={"Content-Disposition": f'attachment; filename="{doc_data["filename"]}"'},
+        headers=headers,
     )
 
+@router.get(
+    "/{id}/thumbnail",
+    summary="Get a JPEG thumbnail of the document",
+    dependencies=[Depends(require_role("user", "admin"))],
+)
+async def get_thumbnail(
+    id: str,
+    request: Request,
+    size: int = Query(256, description=f"One of {', '.join(map(str, THUMBNAIL_SIZES))}"),
+    user=Depends(get_current_user),
+    db=Depends(get_db),
+):
+    """
+    Thumbnails are rendered at upload; documents uploaded before that are
+    rendered on their first thumbnail request. A thumbnail never changes,
+    so it is served with a long-lived cache and its GridFS id as ETag.
+    """
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(THUMBNAIL_SIZES)}")
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="Invalid document ID")
+
+    doc_data = await db.documents.find_one(
+        {"_id": ObjectId(id)}, {"ownerId": 1, "mime": 1, "gridfsId": 1, "thumbnails": 1}
+    )
+    if not doc_data:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc_data.get("ownerId") != user.sub and user.role != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    fs = AsyncIOMotorGridFSBucket(db)
+    links = doc_data.get("thumbnails")
+    if links is None and doc_data.get("mime") in THUMBNAIL_MIMES:
+        gridfs_id = doc_data["gridfsId"]
+        if isinstance(gridfs_id, str):
+            gridfs_id = ObjectId(gridfs_id)
+        with span("gridfs.read", phase="gridfs"):
+            original = await (await fs.open_download_stream(gridfs_id)).read()
+        links = await generate_thumbnails(db, doc_data["_id"], original)
+    if not links:
+        raise HTTPException(status_code=404, detail="No thumbnail available for this document")
+
+    thumb_id = links[str(size)]
+    headers = {
+        "Cache-Control": f"private, max-age={settings.THUMBNAIL_MAX_AGE_SECONDS}, immutable",
+        "ETag": f'"{thumb_id}"',
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    with span("gridfs.read", phase="gridfs"):
+        content = await (await fs.open_download_stream(thumb_id)).read()
+    return Response(content, media_type=THUMBNAIL_MIME, headers=headers)
+
 @router.post(
     "/ocr-scan",
     summary="Upload and OCR via OpenAI Vision",
     dependencies=[Depends(require_role("user", "admin"))],
 )
-async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...),
+async def ocr_scan_doc(background_tasks: BackgroundTasks, file: UploadFile = File(...), primaryTag: str = Form(...),
     secondaryTags: str = Query(None),user=Depends(get_current_user),db=Depends(get_db)):
     """
     OCR Ingestion Endpoint:
@@ -319,7 +463,6 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
     """
     ocr_requests_total.inc()
     # db = get_db()
-    fs = AsyncIOMotorGridFSBucket(db)
     if not primaryTag or not primaryTag.strip():
         raise HTTPException(status_code=400, detail="Primary tag is required for OCR upload.")
 
@@ -330,12 +473,8 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
         raise HTTPException(status_code=400, detail="Uploaded file is not an image")
 
     # --- Store file in GridFS ---
-    upload_stream = fs.open_upload_stream(
-        file.filename, metadata={"ownerId": user.sub, "contentType": mime_type}
-    )
-    await upload_stream.write(file_bytes)
-    await upload_stream.close()
-    file_id = upload_stream._id
+    with span("gridfs.write", phase="gridfs", bytes=len(file_bytes)):
+        file_id = await blobs.store(db, file_bytes, file.filename, {"ownerId": user.sub, "contentType": mime_type})
 
     # --- Prepare image for OpenAI ---
     file_base64 = base64.b64encode(file_bytes).decode("utf-8")
@@ -344,24 +483,25 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
     # --- Call OpenAI Vision OCR ---
     extracted_text = ""
     try:
-        response = await openai_client.responses.create(
-            model="gpt-4o-mini",
-            input=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "input_text",
-                            "text": (
-                                "Extract all visible text, numbers, totals, and table data "
-                                "from this document clearly. Preserve layout meaningfully."
-                            ),
-                        },
-                        {"type": "input_image", "image_url": image_url},
-                    ],
-                }
-            ],
-        )
+        with span("openai.responses", phase="openai", model="gpt-4o-mini"):
+            response = await get_openai_client().responses.create(
+                model="gpt-4o-mini",
+                input=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "input_text",
+                                "text": (
+                                    "Extract all visible text, numbers, totals, and table data "
+                                    "from this document clearly. Preserve layout meaningfully."
+                                ),
+                            },
+                            {"type": "input_image", "image_url": image_url},
+                        ],
+                    }
+                ],
+            )
 
         for item in response.output:
             if item.type == "message":
@@ -375,7 +515,7 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
     except Exception as e:
         errors_total.inc()
         extracted_text = "[OCR Extraction Failed]"
-        await db.audit_logs.insert_one(
+        await log_event(db,
             {
                 "at": now(),
                 "userId": user.sub,
@@ -394,9 +534,12 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
         textContent=extracted_text,
         createdAt=now(),
     )
-    result = await db.documents.insert_one(doc.model_dump(by_alias=True))
+    # long OCR output is stored compressed (textContentZ)
+    result = await db.documents.insert_one({**doc.model_dump(by_alias=True), **compression.pack_text(extracted_text)})
     print(result.inserted_id, type(result.inserted_id))
     doc_id = result.inserted_id
+    if mime_type in THUMBNAIL_MIMES:
+        background_tasks.add_task(generate_thumbnails, db, doc_id, file_bytes)
 
     # --- Classification & unsubscribe ---
     classification = classify_text(extracted_text)
@@ -404,7 +547,7 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
     target = unsub.get("value") if unsub else None
 
     # --- Audit logging ---
-    await db.audit_logs.insert_one(
+    await log_event(db,
         AuditLogModel(
             userId=user.sub,
             action="ocr_scan",
@@ -420,7 +563,8 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
         "$set": {
             "classification": classification,
             "unsubscribeTarget": target
-        }
+        },
+        "$inc": {"version": 1},
     }
 )
 
@@ -445,38 +589,26 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
 
 
     # --- Upsert + link tags ---
+    new_tags = 0
     for tag_name in auto_tags:
-        tag_doc = await db.tags.find_one_and_update(
-        {"ownerId": user.sub, "name": tag_name},
-        {"$setOnInsert": {"createdAt": now()}},
-        upsert=True,
-        return_document=ReturnDocument.AFTER,
-        )
+        tag_id, created = await tag_cache.get_or_create(db, user.sub, tag_name)
+        new_tags += created
 
         await db.document_tags.insert_one({
         "documentId": str(doc_id),
-        "tagId": tag_doc["_id"],
+        "tagId": tag_id,
         "isPrimary": (tag_name == primary_tag_name),
         "createdAt": now(),
         })
-
+    await metrics_rollup.record(db, user.sub, docs=1, folders=new_tags)
+    await trigram_index.index_document(db, user.sub, file.filename, auto_tags)
+    await generations.bump(db, user.sub)
 
     # --- Rate limit + task generation ---
     if classification == "ad":
-        today = datetime.now(timezone.utc)
-        rate_key = f"{user.sub}:{file.filename}:{today.strftime('%Y-%m-%d')}"
-
-        res = await db.rate_limits.find_one_and_update(
-            {"key": rate_key},
-            {"$inc": {"count": 1}, "$setOnInsert": {"createdAt": now()}},
-            upsert=True,
-            return_document=True,
-        )
-
-        if res and res.get("count", 0) > 3:
-            await db.rate_limits.update_one(
-                {"key": rate_key}, {"$inc": {"count": -1}}
-            )
+        rate_key = daily_key(user.sub, file.filename)
+        allowed, _ = await consume_quota(db, rate_key, settings.AD_DAILY_LIMIT)
+        if not allowed:
             return JSONResponse(
                 {"status": "rate_limited", "remaining": 0}, status_code=429
             )
@@ -492,7 +624,7 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
         )
         task_res = await db.tasks.insert_one(task.model_dump(by_alias=True))
 
-        await db.audit_logs.insert_one(
+        await log_event(db,
             AuditLogModel(
                 userId=user.sub,
                 action="task_create",
@@ -502,6 +634,7 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
                 at=now(),
             ).model_dump(by_alias=True)
         )
+        await metrics_rollup.record(db, user.sub, tasks=1)
 
         return {
             "classification": classification,
@@ -523,14 +656,22 @@ async def ocr_scan_doc(file: UploadFile = File(...), primaryTag: str = Form(...)
     summary="List all accessible documents",
     dependencies=[Depends(require_role("user", "admin", "support"))],
 )
-async def list_docs(user=Depends(get_current_user),db=Depends(get_db)):
+async def list_docs(request: Request, user=Depends(get_current_user),db=Depends(get_db)):
     """
     Lists documents visible to the authenticated user.
     - Admin → sees all documents
     - User → sees only their own
     - Support → sees all metadata (read-only)
+    Unchanged since the client's ETag (same owner generation) → 304, no aggregation.
     """
     # db = get_db()
+    list_requests_total.labels(role=user.role).inc()
+
+    owner = user.sub if user.role == "user" else None
+    # read before the aggregation, so the tag can only be older than the body
+    etag = weak_etag("docs", user.role, owner or "*", await generations.current(db, owner))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
 
     query = {}
     if user.role == "user":
@@ -570,14 +711,8 @@ async def list_docs(user=Depends(get_current_user),db=Depends(get_db)):
 
     docs = await db.documents.aggregate(pipeline).to_list(None)
 
-    # --- Convert ObjectId fields to strings ---
-    for d in docs:
-        d["_id"] = str(d["_id"])
-        if "tags" not in d:
-            d["tags"] = []
-
     # --- Log audit trail ---
-    await db.audit_logs.insert_one({
+    await log_event(db, {
         "at": datetime.utcnow(),
         "userId": user.sub,
         "action": "list_docs",
@@ -585,5 +720,5 @@ async def list_docs(user=Depends(get_current_user),db=Depends(get_db)):
         "metadata": {"count": len(docs)},
     })
 
-    return docs
+    return MongoJSONResponse(docs, headers={"ETag": etag, "Cache-Control": REVALIDATE})
 
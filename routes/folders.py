@@ -1,19 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from app.db import get_db
 from app.auth import get_current_user, require_role
 from app.utils import now
+from app.responses import MongoJSONResponse, REVALIDATE, etag_matches, not_modified, weak_etag
+from services.archive import gridfs_entries, stream_zip
+from services.audit import log_event
+from services import generations, tag_cache
 from bson import ObjectId
+from urllib.parse import quote
 
 router = APIRouter(prefix="/v1/folders", tags=["folders"])
 
 @router.get("", summary="List all primary-tag folders", dependencies=[Depends(require_role("user", "admin", "support"))])
-async def list_folders(user=Depends(get_current_user),db=Depends(get_db)):
+async def list_folders(request: Request, user=Depends(get_current_user),db=Depends(get_db)):
     """
     Returns a list of all tags (primary-tag folders).
     - Normal users: only their own tags.
     - Admins: tags from all users (global view).
+    Unchanged since the client's ETag (same owner generation) → 304, no aggregation.
     """
     # db = get_db()
+    owner = user.sub if user.role == "user" else None
+    etag = weak_etag("folders", user.role, owner or "*", await generations.current(db, owner))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
 
     match_stage = {}
     if user.role == "user":  # regular user sees only their own folders
@@ -34,9 +45,9 @@ async def list_folders(user=Depends(get_current_user),db=Depends(get_db)):
         },
         {
             "$project": {
-                "_id": 1,
+                "_id": 0,
+                "id": "$_id",
                 "name": 1,
-                "ownerId": 1,
                 "count": {
                     "$size": {
                         "$filter": {
@@ -45,26 +56,17 @@ async def list_folders(user=Depends(get_current_user),db=Depends(get_db)):
                             "cond": {"$eq": ["$$link.isPrimary", True]}
                         }
                     }
-                }
+                },
+                "ownerId": 1,
             }
         },
         {"$sort": {"name": 1}}
     ])
-
-    folders = await db.tags.aggregate(pipeline).to_list(None)
-
     if user.role != "admin":
-        folders = [f for f in folders if f["count"] > 0]
+        pipeline.append({"$match": {"count": {"$gt": 0}}})
 
-    return [
-        {
-            "id": str(f["_id"]),
-            "name": f["name"],
-            "count": f.get("count", 0),
-            "ownerId": f.get("ownerId")
-        }
-        for f in folders
-    ]
+    folders = await db.tags.aggregate(pipeline).to_list(None)
+    return MongoJSONResponse(folders, headers={"ETag": etag, "Cache-Control": REVALIDATE})
 
 
 @router.get("/{tag}/docs", summary="List documents for a specific tag", dependencies=[Depends(require_role("user", "admin"))])
@@ -74,14 +76,9 @@ async def list_docs_by_tag(tag: str, user=Depends(get_current_user),db=Depends(g
     """
     # db = get_db()
 
-    tag_filter = {"name": tag}
-    if user.role != "admin":
-        tag_filter["ownerId"] = user.sub
-
-    tag_doc = await db.tags.find_one(tag_filter)
-    if not tag_doc:
+    tag_id = await tag_cache.resolve(db, None if user.role == "admin" else user.sub, tag)
+    if not tag_id:
         raise HTTPException(status_code=404, detail="Tag not found")
-    tag_id = tag_doc["_id"]
     doc_tags = await db.document_tags.find({"tagId": tag_id, "isPrimary": True}).to_list(None)
     doc_ids = [ObjectId(d["documentId"]) for d in doc_tags if ObjectId.is_valid(d["documentId"])]
 
@@ -97,3 +94,42 @@ async def list_docs_by_tag(tag: str, user=Depends(get_current_user),db=Depends(g
         }
         for d in docs
     ]
+
+
+@router.get("/{tag}/archive", summary="Download a folder as a ZIP archive", dependencies=[Depends(require_role("user", "admin"))])
+async def archive_folder(
+    tag: str,
+    mode: str = Query("store", pattern="^(store|deflate)$"),
+    user=Depends(get_current_user),
+    db=Depends(get_db),
+):
+    """
+    Streams every document in the folder as a ZIP built on the fly.
+    - store: no compression, cheapest for already-compressed images/PDFs.
+    - deflate: smaller archives for text, at the cost of CPU.
+    """
+    tag_id = await tag_cache.resolve(db, None if user.role == "admin" else user.sub, tag)
+    if not tag_id:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    doc_tags = await db.document_tags.find(
+        {"tagId": tag_id, "isPrimary": True}, {"documentId": 1}
+    ).to_list(None)
+    doc_ids = [ObjectId(d["documentId"]) for d in doc_tags if ObjectId.is_valid(d["documentId"])]
+
+    await log_event(db, {
+        "at": now(),
+        "userId": user.sub,
+        "action": "archive_folder",
+        "entityType": "tag",
+        "entityId": str(tag_id),
+        "metadata": {"mode": mode, "documents": len(doc_ids)},
+    })
+
+    docs = db.documents.find(
+        {"_id": {"$in": doc_ids}}, {"filename": 1, "gridfsId": 1, "createdAt": 1}
+    ).sort("_id", 1)
+    return StreamingResponse(
+        stream_zip(gridfs_entries(db, docs), mode),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(tag)}.zip"},
+    )
@@ -1,17 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from app.auth import get_current_user, require_role
 from app.db import get_db
+from services.audit import log_event, log_events
 from app.utils import now
 from app.schemas import OCRPayload
-from app.models import AuditLogModel, TaskModel, RateLimitModel
+from app.models import AuditLogModel, TaskModel
+from app.config import settings
 from services.ocr_classifier import classify_text, extract_unsubscribe
-from datetime import datetime, timezone
-from pymongo import ReturnDocument
+from services.rate_limit import daily_key, consume_quota, consume_quota_upto
+from services import metrics_rollup
+from pydantic import ValidationError
+import json
 from app.metrics_registry import webhook_calls_total
 from app.metrics_registry import errors_total
 
 router = APIRouter(prefix="/v1/webhooks", tags=["webhooks"])
 
+MAX_BATCH_ITEMS = 5000
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
 
 @router.post("/ocr", dependencies=[Depends(require_role("user", "admin"))])
 async def ocr_webhook(payload: OCRPayload, user=Depends(get_current_user),db=Depends(get_db)):
@@ -38,7 +45,7 @@ async def ocr_webhook(payload: OCRPayload, user=Depends(get_current_user),db=Dep
             metadata={"classification": classification},
             at=now(),
         )
-        await db.audit_logs.insert_one(audit_entry.model_dump(by_alias=True))
+        await log_event(db, audit_entry.model_dump(by_alias=True))
 
         #  Handle non-ad classifications quickly
         if classification != "ad":
@@ -48,24 +55,13 @@ async def ocr_webhook(payload: OCRPayload, user=Depends(get_current_user),db=Dep
         unsub = extract_unsubscribe(payload.text)
         target = unsub.get("value") if unsub else None
 
-        #  Rate limiting (3 per day)
-        today = datetime.now(timezone.utc)
-        rate_key = f"{user.sub}:{payload.source}:{today.strftime('%Y-%m-%d')}"
-
-        res = await db.rate_limits.find_one_and_update(
-            {"key": rate_key},
-            {"$inc": {"count": 1}, "$setOnInsert": {"createdAt": now()}},
-            upsert=True,
-            return_document=ReturnDocument.AFTER,
-        )
-
-        count = res.get("count", 0) if res else 1
-        if count > 3:
-            # rollback increment for fairness
-            await db.rate_limits.update_one({"key": rate_key}, {"$inc": {"count": -1}})
+        #  Rate limiting (AD_DAILY_LIMIT per day)
+        rate_key = daily_key(user.sub, payload.source)
+        allowed, count = await consume_quota(db, rate_key, settings.AD_DAILY_LIMIT)
+        if not allowed:
             return {"status": "rate_limited", "remaining": 0}
 
-        remaining = max(0, 3 - count)
+        remaining = max(0, settings.AD_DAILY_LIMIT - count)
 
         #  Create a new task for processing the ad
         task = TaskModel(
@@ -88,7 +84,8 @@ async def ocr_webhook(payload: OCRPayload, user=Depends(get_current_user),db=Dep
             metadata={"rate_count": count, "source": payload.source},
             at=now(),
         )
-        await db.audit_logs.insert_one(task_audit.model_dump(by_alias=True))
+        await log_event(db, task_audit.model_dump(by_alias=True))
+        await metrics_rollup.record(db, user.sub, tasks=1)
 
         #  Response
         return {
@@ -100,3 +97,129 @@ async def ocr_webhook(payload: OCRPayload, user=Depends(get_current_user),db=Dep
     except Exception as e:
         errors_total.inc()
         raise HTTPException(status_code=500, detail=f"Webhook processing failed: {str(e)}")
+
+
+async def _read_batch(request: Request) -> list:
+    """
+    Parses the batch body as a JSON array, or as NDJSON (one payload per line)
+    when the content type says so. NDJSON is consumed from the stream line by line.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in NDJSON_TYPES:
+        items, buffer = [], b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    items.append(json.loads(line))
+            if len(items) > MAX_BATCH_ITEMS:
+                raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ITEMS} items")
+        if buffer.strip():
+            items.append(json.loads(buffer))
+    else:
+        items = json.loads(await request.body())
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of OCR payloads")
+
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ITEMS} items")
+    return items
+
+
+@router.post("/ocr/batch", dependencies=[Depends(require_role("user", "admin"))])
+async def ocr_webhook_batch(request: Request, user=Depends(get_current_user), db=Depends(get_db)):
+    """
+    Bulk variant of the OCR webhook.
+    - Accepts a JSON array or an NDJSON stream of OCR payloads
+    - Applies the daily "ad" rate limit once per (user, source, day) group
+    - Writes tasks and audit entries with insert_many
+    - Returns one result per input item, in input order
+    """
+    try:
+        raw_items = await _read_batch(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch body: {str(e)}")
+
+    webhook_calls_total.inc(len(raw_items))
+    results = [None] * len(raw_items)
+    audits, ad_groups = [], {}
+
+    #  Validate + classify every item
+    payloads = {}
+    for idx, raw in enumerate(raw_items):
+        try:
+            payload = OCRPayload.model_validate(raw)
+        except ValidationError as e:
+            results[idx] = {"index": idx, "status": "invalid", "errors": e.errors(include_url=False, include_context=False)}
+            continue
+
+        classification = classify_text(payload.text)
+        payloads[idx] = payload
+        audits.append(AuditLogModel(
+            userId=user.sub,
+            action="webhook_ocr",
+            entityType="webhook",
+            entityId=payload.imageId,
+            metadata={"classification": classification, "batch": True},
+            at=now(),
+        ).model_dump(by_alias=True))
+
+        if classification != "ad":
+            results[idx] = {"index": idx, "classification": classification}
+            continue
+        rate_key = daily_key(user.sub, payload.source)
+        ad_groups.setdefault(rate_key, []).append(idx)
+
+    try:
+        #  Rate limiting: one conditional increment per group
+        tasks = []
+        for rate_key, indexes in ad_groups.items():
+            allowed, count = await consume_quota_upto(db, rate_key, settings.AD_DAILY_LIMIT, len(indexes))
+            used_before = (count or 0) - allowed
+            for pos, idx in enumerate(indexes):
+                if pos >= allowed:
+                    results[idx] = {"index": idx, "status": "rate_limited", "remaining": 0}
+                    continue
+
+                payload = payloads[idx]
+                unsub = extract_unsubscribe(payload.text)
+                rate_count = used_before + pos + 1
+                task = TaskModel(
+                    userId=user.sub,
+                    sender=payload.source,
+                    status="pending",
+                    channel="email" if (unsub and unsub.get("type") == "email") else "web",
+                    target=unsub.get("value") if unsub else None,
+                    payload=payload.model_dump(),
+                    createdAt=now(),
+                ).model_dump(by_alias=True)
+                tasks.append(task)
+                audits.append(AuditLogModel(
+                    userId=user.sub,
+                    action="task_create",
+                    entityType="task",
+                    entityId=str(task["_id"]),
+                    metadata={"rate_count": rate_count, "source": payload.source, "batch": True},
+                    at=now(),
+                ).model_dump(by_alias=True))
+                results[idx] = {
+                    "index": idx,
+                    "taskId": str(task["_id"]),
+                    "remaining": max(0, settings.AD_DAILY_LIMIT - rate_count),
+                    "classification": "ad",
+                }
+
+        #  Bulk writes
+        if tasks:
+            await db.tasks.insert_many(tasks, ordered=False)
+            await metrics_rollup.record(db, user.sub, tasks=len(tasks))
+        if audits:
+            await log_events(db, audits)
+
+    except Exception as e:
+        errors_total.inc()
+        raise HTTPException(status_code=500, detail=f"Batch webhook processing failed: {str(e)}")
+
+    return results
@@ -1,13 +1,15 @@
 import asyncio
-from app.db import get_client, get_db
+from app.db import get_client
+from app.config import settings
 from datetime import datetime, timezone
 
 async def seed():
-    db = get_db()
+    db = get_client()[settings.DB_NAME]
     await db.users.delete_many({})
     await db.documents.delete_many({})
     await db.tags.delete_many({})
     await db.document_tags.delete_many({})
+    await db.blobs.delete_many({})
     await db.usage.delete_many({})
     await db.tasks.delete_many({})
     await db.audit_logs.delete_many({})
@@ -21,6 +23,8 @@ async def seed():
     d = {"ownerId":"user1", "filename":"inv-jan.pdf", "mime":"application/pdf","textContent":"Invoice 1 amount due 100","raw":"", "createdAt":datetime.now(timezone.utc)}
     dr = await db.documents.insert_one(d)
     await db.document_tags.insert_one({"documentId":dr.inserted_id,"tagId":tr.inserted_id, "isPrimary":True})
+    # invalidate cached views of the wiped data in running servers
+    await db.generations.update_many({}, {"$inc": {"gen": 1}})
     print("Seed is successful")
 
 if __name__ == "__main__":
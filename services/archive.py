@@ -0,0 +1,143 @@
+from app.config import settings
+from datetime import datetime
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from services.compression import decompress_chunks
+import asyncio, io, zipfile
+
+ZIP_MODES = {"store": zipfile.ZIP_STORED, "deflate": zipfile.ZIP_DEFLATED}
+_END = object()
+
+
+class _ZipSink(io.RawIOBase):
+    """
+    Write-only, non-seekable target for ZipFile. zipfile then emits data
+    descriptors instead of seeking back, and whatever it wrote so far can be
+    drained and sent to the client.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def unique_name(name: str, seen: set) -> str:
+    name = (name or "file").replace("/", "_").replace("\\", "_")
+    candidate, n = name, 1
+    stem, dot, ext = name.rpartition(".")
+    while candidate in seen:
+        n += 1
+        candidate = f"{stem} ({n}).{ext}" if dot and stem else f"{name} ({n})"
+    seen.add(candidate)
+    return candidate
+
+
+async def _gridfs_chunks(grid_out):
+    while True:
+        chunk = await grid_out.readchunk()
+        if not chunk:
+            return
+        yield chunk
+
+
+async def gridfs_entries(db, docs):
+    """
+    Archive entries for an async iterable of documents, reading each blob
+    chunk by chunk from GridFS. Documents whose blob is missing are skipped.
+    """
+    fs = AsyncIOMotorGridFSBucket(db)
+    seen = set()
+    async for doc in docs:
+        gridfs_id = doc.get("gridfsId")
+        if isinstance(gridfs_id, str) and ObjectId.is_valid(gridfs_id):
+            gridfs_id = ObjectId(gridfs_id)
+        try:
+            grid_out = await fs.open_download_stream(gridfs_id)
+        except NoFile:
+            print("Warning: archive skipped document without blob:", doc["_id"])
+            continue
+        name = unique_name(doc.get("filename"), seen)
+        # text blobs may be stored compressed (see services/compression.py)
+        meta = grid_out.metadata or {}
+        length = meta.get("originalLength", grid_out.length)
+        chunks = decompress_chunks(_gridfs_chunks(grid_out), meta.get("contentEncoding"))
+        yield name, doc.get("createdAt"), length, chunks
+
+
+async def _prefetch(entries, out: asyncio.Queue):
+    """Reads entry chunks ahead of the zip writer, at most `out.maxsize` chunks."""
+    try:
+        async for name, modified, length, chunks in entries:
+            await out.put(("start", name, modified, length))
+            async for chunk in chunks:
+                await out.put(("data", chunk))
+            await out.put(("end",))
+        await out.put(_END)
+    except Exception as e:
+        await out.put(e)
+
+
+async def stream_zip(entries, mode: str = "store"):
+    """
+    Yields a ZIP archive as it is built.
+    `entries` is an async iterable of (name, modified datetime, length, async chunk iterator).
+    Chunks are read ahead through a bounded queue; nothing is buffered beyond that
+    and the bytes zipfile produced for the current chunk.
+    """
+    compression = ZIP_MODES[mode]
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ARCHIVE_READ_AHEAD_CHUNKS)
+    reader = asyncio.create_task(_prefetch(entries, queue))
+
+    sink = _ZipSink()
+    zf = zipfile.ZipFile(sink, mode="w", compression=compression, compresslevel=settings.ARCHIVE_DEFLATE_LEVEL)
+    dest = None
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            kind = item[0]
+            if kind == "start":
+                _, name, modified, length = item
+                info = zipfile.ZipInfo(name, date_time=(modified or datetime.now()).timetuple()[:6])
+                info.compress_type = compression
+                # the declared size lets zipfile pick zip64 headers up front
+                info.file_size = length
+                dest = zf.open(info, mode="w")
+            elif kind == "data":
+                if compression == zipfile.ZIP_DEFLATED:
+                    await asyncio.to_thread(dest.write, item[1])
+                else:
+                    dest.write(item[1])
+            else:
+                dest.close()
+                dest = None
+
+            data = sink.drain()
+            if data:
+                yield data
+
+        zf.close()
+        yield sink.drain()
+    finally:
+        reader.cancel()
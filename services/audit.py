@@ -0,0 +1,178 @@
+from app.config import settings
+from datetime import datetime, timezone, timedelta
+from pymongo import ASCENDING
+from pymongo.errors import CollectionInvalid
+from app.tracing import span
+import asyncio
+
+AUDIT_COLLECTION = "audit_logs"
+ROLLUP_COLLECTION = "audit_rollups"
+JOB_STATE_COLLECTION = "rollup_jobs"
+HOURLY_JOB = "audit_hourly"
+
+# rows written before `meta` existed only carry the top-level fields
+ACTION_EXPR = {"$ifNull": ["$meta.action", "$action"]}
+USER_EXPR = {"$ifNull": ["$meta.userId", {"$ifNull": ["$userId", "$performedBy"]}]}
+
+
+def _with_meta(entry: dict) -> dict:
+    """
+    Time-series buckets are keyed by the metaField, so userId/action are copied into `meta`.
+    The top-level fields stay for readers of older, non-time-series audit_logs.
+    """
+    entry = dict(entry)
+    entry["meta"] = {
+        "userId": entry.get("userId") or entry.get("performedBy"),
+        "action": entry.get("action"),
+    }
+    return entry
+
+
+async def log_event(db, entry: dict):
+    with span("audit.log", phase="audit"):
+        await db[AUDIT_COLLECTION].insert_one(_with_meta(entry))
+
+
+async def log_events(db, entries: list[dict]):
+    if entries:
+        with span("audit.log_many", phase="audit", count=len(entries)):
+            await db[AUDIT_COLLECTION].insert_many([_with_meta(e) for e in entries], ordered=False)
+
+
+async def ensure_audit_collections(db):
+    """
+    Creates audit_logs as a time-series collection on fresh databases.
+    An existing plain audit_logs collection is left as it is.
+    """
+    try:
+        await db.create_collection(
+            AUDIT_COLLECTION,
+            timeseries={"timeField": "at", "metaField": "meta", "granularity": "minutes"},
+            expireAfterSeconds=settings.AUDIT_RETENTION_DAYS * 24 * 3600,
+        )
+    except CollectionInvalid:
+        pass
+    await db[ROLLUP_COLLECTION].create_index(
+        [("_id.period", ASCENDING), ("_id.action", ASCENDING), ("_id.userId", ASCENDING), ("_id.start", ASCENDING)]
+    )
+
+
+def _hour_floor(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+async def _watermark(db) -> datetime | None:
+    state = await db[JOB_STATE_COLLECTION].find_one({"_id": HOURLY_JOB})
+    if not state:
+        return None
+    mark = state["watermark"]
+    return mark if mark.tzinfo else mark.replace(tzinfo=timezone.utc)
+
+
+async def run_rollup_job(db, until: datetime | None = None):
+    """
+    Folds closed hours of raw audit events into hourly rollups, then rebuilds the
+    daily rollups for the days those hours touch. Safe to re-run: rollups are
+    replaced, not incremented, and the watermark only moves forward.
+
+    The last closed hour is rolled up again on every run, so a slow insert that
+    commits just after its hour closed is still counted.
+    """
+    end = _hour_floor(until or datetime.now(timezone.utc))
+    start = await _watermark(db)
+    if start is not None:
+        start -= timedelta(hours=1)
+    else:
+        first = await db[AUDIT_COLLECTION].find_one({}, sort=[("at", ASCENDING)])
+        if not first:
+            return
+        first_at = first["at"] if first["at"].tzinfo else first["at"].replace(tzinfo=timezone.utc)
+        start = _hour_floor(first_at)
+    if start >= end:
+        return
+
+    await db[AUDIT_COLLECTION].aggregate([
+        {"$match": {"at": {"$gte": start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                "period": "hour",
+                "userId": USER_EXPR,
+                "action": ACTION_EXPR,
+                "start": {"$dateTrunc": {"date": "$at", "unit": "hour"}},
+            },
+            "count": {"$sum": 1},
+        }},
+        {"$merge": {"into": ROLLUP_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]).to_list(None)
+
+    day_start = start.replace(hour=0)
+    await db[ROLLUP_COLLECTION].aggregate([
+        {"$match": {"_id.period": "hour", "_id.start": {"$gte": day_start, "$lt": end}}},
+        {"$group": {
+            "_id": {
+                "period": "day",
+                "userId": "$_id.userId",
+                "action": "$_id.action",
+                "start": {"$dateTrunc": {"date": "$_id.start", "unit": "day"}},
+            },
+            "count": {"$sum": "$count"},
+        }},
+        {"$merge": {"into": ROLLUP_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]).to_list(None)
+
+    await db[JOB_STATE_COLLECTION].update_one(
+        {"_id": HOURLY_JOB}, {"$set": {"watermark": end}}, upsert=True
+    )
+
+
+async def _sum_rollups(db, period: str, action: str, start: datetime, end: datetime, user_id: str | None) -> int:
+    match = {"_id.period": period, "_id.action": action, "_id.start": {"$gte": start, "$lt": end}}
+    if user_id is not None:
+        match["_id.userId"] = user_id
+    res = await db[ROLLUP_COLLECTION].aggregate([
+        {"$match": match},
+        {"$group": {"_id": None, "count": {"$sum": "$count"}}},
+    ]).to_list(1)
+    return res[0]["count"] if res else 0
+
+
+async def count_events(db, action: str, since: datetime, user_id: str | None = None) -> int:
+    """
+    Counts audit events of one action since `since` (an hour boundary).
+    Whole days come from daily rollups, leftover hours from hourly rollups and
+    only the not-yet-rolled-up tail from raw events.
+    """
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    mark = await _watermark(db) or since
+    mark = max(mark, since)
+
+    first_day = since.replace(hour=0, minute=0, second=0, microsecond=0)
+    if first_day < since:
+        first_day += timedelta(days=1)
+    last_day = mark.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    total = 0
+    if first_day < last_day:
+        total += await _sum_rollups(db, "day", action, first_day, last_day, user_id)
+        total += await _sum_rollups(db, "hour", action, since, first_day, user_id)
+        total += await _sum_rollups(db, "hour", action, last_day, mark, user_id)
+    else:
+        total += await _sum_rollups(db, "hour", action, since, mark, user_id)
+
+    matches = [{"$eq": [ACTION_EXPR, action]}]
+    if user_id is not None:
+        matches.append({"$eq": [USER_EXPR, user_id]})
+    raw = {"at": {"$gte": mark}, "$expr": {"$and": matches}}
+    total += await db[AUDIT_COLLECTION].count_documents(raw)
+    return total
+
+
+async def rollup_forever(db):
+    """Background loop started from the app lifespan."""
+    while True:
+        try:
+            await run_rollup_job(db)
+        except Exception as e:
+            print("Warning: audit rollup job failed:", e)
+        await asyncio.sleep(settings.AUDIT_ROLLUP_INTERVAL_SECONDS)
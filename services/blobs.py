@@ -0,0 +1,187 @@
+"""
+Content-addressed GridFS storage. `blobs` maps the SHA-256 of a file's bytes
+to the GridFS file holding them and counts the documents pointing at it, so
+identical uploads share one file and a delete only removes the bytes once the
+last reference is gone.
+
+Files stored before dedup was enabled are folded in by the background sweep,
+or in one go with:
+
+    python -m services.blobs
+"""
+from app.config import settings
+from app.metrics_registry import gridfs_dedup_hits_total, gridfs_dedup_bytes_saved_total
+from app.utils import now
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from services import compression, generations
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import asyncio, hashlib
+
+HASH_IN_THREAD_BYTES = 1024 * 1024
+
+
+async def ensure_blob_indexes(db):
+    await db.blobs.create_index([("gridfsId", ASCENDING)])
+
+
+async def _digest(data: bytes) -> str:
+    if len(data) >= HASH_IN_THREAD_BYTES:
+        # hashlib releases the GIL on large buffers
+        return await asyncio.to_thread(lambda: hashlib.sha256(data).hexdigest())
+    return hashlib.sha256(data).hexdigest()
+
+
+async def _add_refs(db, digest: str, n: int = 1):
+    """Takes n references on a live blob; None if there is none (or it is being released)."""
+    return await db.blobs.find_one_and_update(
+        {"_id": digest, "refs": {"$gt": 0}}, {"$inc": {"refs": n}},
+        projection={"gridfsId": 1}, return_document=ReturnDocument.AFTER,
+    )
+
+
+async def store(db, data: bytes, filename: str, metadata: dict):
+    """
+    Returns the GridFS id to use as a document's gridfsId. Text is compressed
+    first (see services/compression.py). With GRIDFS_DEDUP the stored bytes are
+    hashed and an existing identical file is reused without writing a single
+    chunk; the caller owns one reference either way.
+    """
+    fs = AsyncIOMotorGridFSBucket(db)
+    data, encoding_meta = compression.pack_blob(data, metadata.get("contentType"))
+    metadata = {**metadata, **encoding_meta}
+    if not settings.GRIDFS_DEDUP:
+        return await fs.upload_from_stream(filename, data, metadata=metadata)
+
+    digest = await _digest(data)
+    blob = await _add_refs(db, digest)
+    if blob:
+        gridfs_dedup_hits_total.inc()
+        gridfs_dedup_bytes_saved_total.inc(len(data))
+        return blob["gridfsId"]
+
+    file_id = await fs.upload_from_stream(filename, data, metadata={**metadata, "sha256": digest})
+    try:
+        await db.blobs.insert_one(
+            {"_id": digest, "gridfsId": file_id, "size": len(data), "refs": 1, "createdAt": now()}
+        )
+    except DuplicateKeyError:
+        # the same bytes were stored concurrently; keep theirs
+        blob = await _add_refs(db, digest)
+        if blob:
+            await fs.delete(file_id)
+            gridfs_dedup_hits_total.inc()
+            gridfs_dedup_bytes_saved_total.inc(len(data))
+            return blob["gridfsId"]
+        # theirs is being released: ours stays an unshared file
+    return file_id
+
+
+async def release(db, gridfs_id):
+    """
+    Drops one reference, deleting the GridFS file with the last one. Files that
+    were never registered (not yet swept, or dedup off) have a single owner.
+    """
+    fs = AsyncIOMotorGridFSBucket(db)
+    blob = await db.blobs.find_one_and_update(
+        {"gridfsId": gridfs_id}, {"$inc": {"refs": -1}}, return_document=ReturnDocument.AFTER
+    )
+    if blob is None:
+        await fs.delete(gridfs_id)
+        return True
+    if blob["refs"] > 0:
+        return False
+    result = await db.blobs.delete_one({"_id": blob["_id"], "refs": {"$lte": 0}})
+    if result.deleted_count:
+        await fs.delete(gridfs_id)
+    return bool(result.deleted_count)
+
+
+async def _hash_file(fs, file_id) -> str:
+    h = hashlib.sha256()
+    stream = await fs.open_download_stream(file_id)
+    while chunk := await stream.readchunk():
+        h.update(chunk)
+    return h.hexdigest()
+
+
+async def _fold_in(db, fs, file_id, digest: str) -> int:
+    """Registers a swept file, or repoints its documents at an identical blob. Returns bytes freed."""
+    refs = await db.documents.count_documents({"gridfsId": file_id})
+    if refs == 0:
+        return 0  # thumbnails and orphans are not shared
+    while True:
+        try:
+            await db.blobs.insert_one({"_id": digest, "gridfsId": file_id, "refs": refs, "createdAt": now()})
+            return 0
+        except DuplicateKeyError:
+            pass
+        # take the references before repointing so the target cannot be released underneath
+        blob = await _add_refs(db, digest, refs)
+        if blob:
+            break
+        await asyncio.sleep(0.05)  # an existing blob is mid-release; retry the insert
+
+    owners = await db.documents.distinct("ownerId", {"gridfsId": file_id})
+    result = await db.documents.update_many(
+        {"gridfsId": file_id}, {"$set": {"gridfsId": blob["gridfsId"]}, "$inc": {"version": 1}}
+    )
+    for owner_id in owners:
+        await generations.bump(db, owner_id)  # cached document responses show gridfsId
+    if result.modified_count != refs:
+        await db.blobs.update_one({"_id": digest}, {"$inc": {"refs": result.modified_count - refs}})
+    info = await db["fs.files"].find_one({"_id": file_id}, {"length": 1})
+    await fs.delete(file_id)
+    return (info or {}).get("length", 0)
+
+
+async def dedupe_existing(db, limit: int | None = None) -> dict:
+    """
+    Hashes GridFS files that have no sha256 yet and folds duplicates into one
+    blob. Each file is claimed by writing its hash, so concurrent sweeps in
+    several workers never process the same file twice.
+    """
+    fs = AsyncIOMotorGridFSBucket(db)
+    stats = {"scanned": 0, "merged": 0, "bytes_freed": 0}
+    cursor = db["fs.files"].find({"metadata.sha256": {"$exists": False}}, {"_id": 1})
+    if limit:
+        cursor = cursor.limit(limit)
+    async for f in cursor:
+        try:
+            digest = await _hash_file(fs, f["_id"])
+        except Exception as e:
+            print("Warning: dedup sweep could not read", f["_id"], e)
+            continue
+        claimed = await db["fs.files"].update_one(
+            {"_id": f["_id"], "metadata.sha256": {"$exists": False}}, {"$set": {"metadata.sha256": digest}}
+        )
+        if not claimed.modified_count:
+            continue
+        stats["scanned"] += 1
+        freed = await _fold_in(db, fs, f["_id"], digest)
+        if freed:
+            stats["merged"] += 1
+            stats["bytes_freed"] += freed
+            gridfs_dedup_bytes_saved_total.inc(freed)
+    return stats
+
+
+async def dedupe_forever(db):
+    """Background loop started from the app lifespan."""
+    while True:
+        try:
+            await dedupe_existing(db, settings.GRIDFS_DEDUP_SWEEP_BATCH)
+        except Exception as e:
+            print("Warning: GridFS dedup sweep failed:", e)
+        await asyncio.sleep(settings.GRIDFS_DEDUP_SWEEP_SECONDS)
+
+
+if __name__ == "__main__":
+    from app.db import get_client
+
+    async def _main():
+        db = get_client()[settings.DB_NAME]
+        await ensure_blob_indexes(db)
+        return await dedupe_existing(db)
+
+    print(asyncio.run(_main()))
@@ -0,0 +1,141 @@
+"""
+Compression at rest for text blobs and large OCR text.
+
+GridFS files record their codec in metadata.contentEncoding (plus
+metadata.originalLength); documents with compressed OCR text keep it in
+textContentZ with textContentEncoding instead of textContent. Readers go
+through decompress()/unpack_text() and never see the difference.
+"""
+from app.config import settings
+from bson import Binary
+import gzip, zlib
+
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+TEXT_MIMES = {"application/json", "application/xml", "application/csv"}
+_zstd = None
+_zstd_missing = None
+
+
+def _zstandard():
+    # imported on first use, like the other optional clients (see app/llm.py)
+    global _zstd
+    if _zstd is None:
+        import zstandard
+        _zstd = zstandard
+    return _zstd
+
+
+def codec() -> str | None:
+    """The configured codec, falling back to gzip when zstandard is not installed."""
+    global _zstd_missing
+    name = settings.COMPRESSION_AT_REST
+    if name == "zstd":
+        if _zstd_missing is None:
+            try:
+                _zstandard()
+                _zstd_missing = False
+            except ImportError:
+                print("Warning: zstandard is not installed, compressing with gzip instead")
+                _zstd_missing = True
+        if _zstd_missing:
+            name = "gzip"
+    return name if name in ("zstd", "gzip") else None
+
+
+def is_text_mime(mime: str | None) -> bool:
+    mime = (mime or "").split(";")[0].strip().lower()
+    return mime.startswith("text/") or mime in TEXT_MIMES
+
+
+def compress(data: bytes, min_bytes: int | None = None) -> tuple[bytes, str | None]:
+    """(stored bytes, encoding). Data that is small or does not shrink is returned as is."""
+    name = codec()
+    if name is None or len(data) < (settings.COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes):
+        return data, None
+    if name == "zstd":
+        packed = _zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        # mtime=0 keeps the output deterministic, which content-addressed storage relies on
+        packed = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(packed) >= len(data):
+        return data, None
+    return packed, name
+
+
+def decompress(data: bytes, encoding: str | None) -> bytes:
+    if not encoding:
+        return data
+    if encoding == "zstd":
+        return _zstandard().ZstdDecompressor().decompress(data)
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"Unknown content encoding: {encoding}")
+
+
+async def decompress_chunks(chunks, encoding: str | None):
+    """Async chunk iterator decoded on the fly."""
+    if not encoding:
+        async for chunk in chunks:
+            yield chunk
+        return
+    if encoding == "zstd":
+        decoder = _zstandard().ZstdDecompressor().decompressobj()
+    elif encoding == "gzip":
+        decoder = zlib.decompressobj(wbits=31)
+    else:
+        raise ValueError(f"Unknown content encoding: {encoding}")
+    async for chunk in chunks:
+        out = decoder.decompress(chunk)
+        if out:
+            yield out
+    if encoding == "gzip":
+        tail = decoder.flush()
+        if tail:
+            yield tail
+
+
+def accepts(accept_encoding: str | None, encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows `encoding` (q=0 refuses it)."""
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() not in (encoding, "*"):
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def pack_blob(data: bytes, mime: str | None) -> tuple[bytes, dict]:
+    """Stored bytes for a GridFS file and the metadata describing them."""
+    if not is_text_mime(mime):
+        return data, {}
+    packed, encoding = compress(data)
+    if encoding is None:
+        return data, {}
+    return packed, {"contentEncoding": encoding, "originalLength": len(data)}
+
+
+def pack_text(text: str | None) -> dict:
+    """Document fields holding OCR text, compressed past TEXT_CONTENT_COMPRESS_BYTES."""
+    raw = (text or "").encode("utf-8")
+    if text is None or len(raw) < settings.TEXT_CONTENT_COMPRESS_BYTES:
+        return {"textContent": text}
+    packed, encoding = compress(raw, min_bytes=0)
+    if encoding is None:
+        return {"textContent": text}
+    return {"textContent": None, "textContentZ": Binary(packed), "textContentEncoding": encoding}
+
+
+def unpack_text(doc: dict) -> dict:
+    """Restores textContent in place on a document read from Mongo."""
+    packed = doc.pop("textContentZ", None)
+    encoding = doc.pop("textContentEncoding", None)
+    if packed is not None:
+        doc["textContent"] = decompress(bytes(packed), encoding).decode("utf-8")
+    return doc
@@ -0,0 +1,305 @@
+from app.config import settings
+from app.metrics_registry import (
+    tasks_dispatched_total,
+    tasks_dead_lettered_total,
+    task_dispatch_lag_seconds,
+    task_queue_oldest_seconds,
+    tasks_in_flight,
+    errors_total,
+)
+from datetime import datetime, timezone, timedelta
+from email.message import EmailMessage
+from pymongo import ASCENDING
+from typing import TYPE_CHECKING
+import asyncio, smtplib, uuid
+
+if TYPE_CHECKING:
+    import httpx  # annotations only; imported lazily at runtime
+
+
+class PermanentTaskError(Exception):
+    """Raised by a handler when retrying cannot help; the task is dead-lettered at once."""
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+async def ensure_task_indexes(db):
+    await db.tasks.create_index([("status", ASCENDING), ("leaseUntil", ASCENDING), ("createdAt", ASCENDING)])
+
+
+# --- Channel handlers ---
+# A handler is `async def handler(target, tasks)`; all tasks share the same channel and target.
+
+class SmtpUnsubscribeHandler:
+    def __init__(self, host: str | None = None, port: int | None = None, sender: str | None = None):
+        self.host = host or settings.SMTP_HOST
+        self.port = port or settings.SMTP_PORT
+        self.sender = sender or settings.SMTP_FROM
+
+    async def __call__(self, target, tasks):
+        if not target:
+            raise PermanentTaskError("email task has no target")
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = target
+        msg["Subject"] = "unsubscribe"
+        msg.set_content(f"Please unsubscribe this address. ({len(tasks)} request(s))")
+
+        def _send():
+            with smtplib.SMTP(self.host, self.port, timeout=settings.DISPATCHER_HTTP_TIMEOUT) as smtp:
+                smtp.send_message(msg)
+
+        await asyncio.to_thread(_send)
+
+
+class WebUnsubscribeHandler:
+    def __init__(self, transport: "httpx.AsyncBaseTransport | None" = None):
+        # tests pass an httpx.MockTransport as the HTTP stand-in
+        self.transport = transport
+
+    async def __call__(self, target, tasks):
+        if not target or not target.lower().startswith(("http://", "https://")):
+            raise PermanentTaskError(f"web task has no usable URL: {target!r}")
+        import httpx  # only needed once a dispatcher actually runs
+
+        async with httpx.AsyncClient(
+            transport=self.transport, timeout=settings.DISPATCHER_HTTP_TIMEOUT, follow_redirects=True
+        ) as client:
+            resp = await client.get(target)
+        if 400 <= resp.status_code < 500:
+            raise PermanentTaskError(f"unsubscribe URL returned {resp.status_code}")
+        resp.raise_for_status()
+
+
+def default_handlers():
+    return {"email": SmtpUnsubscribeHandler(), "web": WebUnsubscribeHandler()}
+
+
+class TaskDispatcher:
+    """
+    Consumes pending tasks from the `tasks` collection.
+    - Tasks are claimed a batch at a time and leased for `lease_seconds`, renewed while the
+      batch is processed; a worker that dies leaves the lease to expire and the task becomes
+      claimable again.
+    - Each claimed batch is grouped by (channel, target) so a target is handled once per batch.
+    - Failures are retried with linear backoff, then moved to status "dead"; so are tasks
+      whose last attempt lost its lease without an outcome.
+    """
+
+    def __init__(
+        self,
+        db,
+        handlers: dict | None = None,
+        workers: int | None = None,
+        batch_size: int | None = None,
+        lease_seconds: int | None = None,
+        max_attempts: int | None = None,
+        retry_backoff_seconds: float | None = None,
+        poll_seconds: float | None = None,
+    ):
+        self.db = db
+        self.handlers = handlers if handlers is not None else default_handlers()
+        self.workers = workers or settings.DISPATCHER_WORKERS
+        self.batch_size = batch_size or settings.DISPATCHER_BATCH_SIZE
+        self.lease_seconds = lease_seconds or settings.DISPATCHER_LEASE_SECONDS
+        self.max_attempts = max_attempts or settings.DISPATCHER_MAX_ATTEMPTS
+        self.retry_backoff_seconds = (
+            settings.DISPATCHER_RETRY_BACKOFF_SECONDS if retry_backoff_seconds is None else retry_backoff_seconds
+        )
+        self.poll_seconds = settings.DISPATCHER_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self._runners: list[asyncio.Task] = []
+
+    # --- Claiming ---
+    @staticmethod
+    def _unleased(now: datetime) -> dict:
+        return {
+            "status": {"$in": ["pending", "processing"]},
+            "$or": [{"leaseUntil": None}, {"leaseUntil": {"$lte": now}}],
+        }
+
+    def _claimable(self, now: datetime) -> dict:
+        # $not also matches tasks that were never attempted
+        return {**self._unleased(now), "attempts": {"$not": {"$gte": self.max_attempts}}}
+
+    async def _dead_letter_abandoned(self, now: datetime):
+        """
+        A task whose last allowed attempt lost its lease never reached _fail (the
+        worker died or hung), so it is dead-lettered here instead of re-claimed.
+        """
+        while True:
+            task = await self.db.tasks.find_one_and_update(
+                {**self._unleased(now), "attempts": {"$gte": self.max_attempts}},
+                {
+                    "$set": {"status": "dead", "deadLetteredAt": now, "lastError": "lease expired on the last attempt"},
+                    "$unset": {"leaseUntil": "", "leaseToken": ""},
+                },
+                projection={"channel": 1},
+            )
+            if task is None:
+                return
+            tasks_dead_lettered_total.labels(task.get("channel")).inc()
+            tasks_dispatched_total.labels(task.get("channel"), "dead").inc()
+
+    async def claim_batch(self, token: str) -> list[dict]:
+        """
+        Claims up to batch_size of the oldest claimable tasks: pick candidate ids,
+        lease them under the same filter (so tasks another worker took in between
+        are skipped), and pick again for the ones lost until the batch is full or
+        nothing claimable is left. The claimed tasks are then read back by token.
+        """
+        now = _utcnow()
+        await self._dead_letter_abandoned(now)
+        claimable = self._claimable(now)
+        claimed_ids = []
+        claimed = 0
+        while claimed < self.batch_size:
+            candidates = await self.db.tasks.find(
+                {**claimable, "_id": {"$nin": claimed_ids}}, {"_id": 1}
+            ).sort("createdAt", ASCENDING).limit(self.batch_size - claimed).to_list(None)
+            if not candidates:
+                break
+            ids = [t["_id"] for t in candidates]
+            result = await self.db.tasks.update_many(
+                {**claimable, "_id": {"$in": ids}},
+                {
+                    "$set": {
+                        "status": "processing",
+                        "leaseToken": token,
+                        "leaseUntil": now + timedelta(seconds=self.lease_seconds),
+                    },
+                    "$inc": {"attempts": 1},
+                },
+            )
+            claimed_ids += ids
+            claimed += result.modified_count
+        if not claimed:
+            return []
+        return await self.db.tasks.find({"_id": {"$in": claimed_ids}, "leaseToken": token}).sort(
+            "createdAt", ASCENDING
+        ).to_list(None)
+
+    async def _keep_leases(self, ids: list, token: str):
+        """Renews the batch's leases while it is processed, so a slow handler is not re-claimed."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.db.tasks.update_many(
+                    {"_id": {"$in": ids}, "leaseToken": token},
+                    {"$set": {"leaseUntil": _utcnow() + timedelta(seconds=self.lease_seconds)}},
+                )
+            except Exception as e:
+                print("Warning: dispatcher could not renew leases:", e)
+
+    # --- Outcomes ---
+    async def _complete(self, tasks: list[dict], token: str):
+        now = _utcnow()
+        await self.db.tasks.update_many(
+            {"_id": {"$in": [t["_id"] for t in tasks]}, "leaseToken": token},
+            {"$set": {"status": "done", "doneAt": now}, "$unset": {"leaseUntil": "", "leaseToken": ""}},
+        )
+        for t in tasks:
+            tasks_dispatched_total.labels(t.get("channel"), "done").inc()
+            if t.get("createdAt"):
+                task_dispatch_lag_seconds.observe((now - _as_utc(t["createdAt"])).total_seconds())
+
+    async def _fail(self, tasks: list[dict], token: str, error: Exception, permanent: bool):
+        now = _utcnow()
+        for t in tasks:
+            channel = t.get("channel")
+            if permanent or t.get("attempts", 1) >= self.max_attempts:
+                update = {
+                    "$set": {"status": "dead", "deadLetteredAt": now, "lastError": str(error)},
+                    "$unset": {"leaseUntil": "", "leaseToken": ""},
+                }
+                tasks_dead_lettered_total.labels(channel).inc()
+                outcome = "dead"
+            else:
+                retry_at = now + timedelta(seconds=self.retry_backoff_seconds * t.get("attempts", 1))
+                update = {
+                    "$set": {"status": "pending", "leaseUntil": retry_at, "lastError": str(error)},
+                    "$unset": {"leaseToken": ""},
+                }
+                outcome = "retry"
+            await self.db.tasks.update_one({"_id": t["_id"], "leaseToken": token}, update)
+            tasks_dispatched_total.labels(channel, outcome).inc()
+
+    # --- Processing ---
+    async def process_batch(self, tasks: list[dict], token: str):
+        groups: dict[tuple, list[dict]] = {}
+        for t in tasks:
+            key = (t.get("channel"), (t.get("target") or "").lower())
+            groups.setdefault(key, []).append(t)
+
+        for (channel, _), group in groups.items():
+            handler = self.handlers.get(channel)
+            try:
+                if handler is None:
+                    raise PermanentTaskError(f"no handler for channel {channel!r}")
+                await handler(group[0].get("target"), group)
+            except PermanentTaskError as e:
+                await self._fail(group, token, e, permanent=True)
+            except Exception as e:
+                errors_total.inc()
+                await self._fail(group, token, e, permanent=False)
+            else:
+                await self._complete(group, token)
+
+    async def run_once(self) -> int:
+        """Claims and processes one batch. Returns the number of tasks handled."""
+        token = uuid.uuid4().hex
+        batch = await self.claim_batch(token)
+        if not batch:
+            return 0
+        tasks_in_flight.inc(len(batch))
+        renew = asyncio.create_task(self._keep_leases([t["_id"] for t in batch], token))
+        try:
+            await self.process_batch(batch, token)
+        finally:
+            renew.cancel()
+            tasks_in_flight.dec(len(batch))
+        return len(batch)
+
+    async def update_lag(self):
+        oldest = await self.db.tasks.find_one(
+            {"status": "pending"}, {"createdAt": 1}, sort=[("createdAt", ASCENDING)]
+        )
+        age = (_utcnow() - _as_utc(oldest["createdAt"])).total_seconds() if oldest else 0
+        task_queue_oldest_seconds.set(max(0, age))
+
+    # --- Lifecycle ---
+    async def _worker(self):
+        while True:
+            try:
+                handled = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                errors_total.inc()
+                print("Warning: dispatcher worker error:", e)
+                handled = 0
+            if not handled:
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _monitor(self):
+        while True:
+            try:
+                await self.update_lag()
+            except Exception as e:
+                print("Warning: dispatcher lag probe failed:", e)
+            await asyncio.sleep(max(self.poll_seconds, 5))
+
+    def start(self):
+        self._runners = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._runners.append(asyncio.create_task(self._monitor()))
+
+    async def stop(self):
+        for runner in self._runners:
+            runner.cancel()
+        await asyncio.gather(*self._runners, return_exceptions=True)
+        self._runners = []
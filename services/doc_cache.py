@@ -0,0 +1,70 @@
+from app.config import settings
+from app.metrics_registry import doc_cache_lookups_total, doc_cache_bytes, doc_cache_entries
+from collections import OrderedDict
+import time
+
+# document id -> (ownerId, generation, expires_at, etag, body)
+_entries: OrderedDict = OrderedDict()
+_size = 0
+
+
+def _entry_size(doc_id: str, body: bytes) -> int:
+    return len(body) + len(doc_id) + 192
+
+
+def _drop(doc_id):
+    global _size
+    entry = _entries.pop(doc_id)
+    _size -= _entry_size(doc_id, entry[4])
+
+
+def _update_gauges():
+    doc_cache_bytes.set(_size)
+    doc_cache_entries.set(len(_entries))
+
+
+def owner_of(doc_id: str) -> str | None:
+    """Owner of a document seen before, so its generation can be read before the document."""
+    entry = _entries.get(doc_id)
+    return entry[0] if entry else None
+
+
+def get(doc_id: str, generation: int):
+    """(ownerId, etag, body) if cached for the owner's current generation, else None."""
+    entry = _entries.get(doc_id)
+    if entry is not None and (entry[1] != generation or entry[2] < time.monotonic()):
+        _drop(doc_id)
+        _update_gauges()
+        entry = None
+    if entry is None:
+        doc_cache_lookups_total.labels(result="miss").inc()
+        return None
+    _entries.move_to_end(doc_id)
+    doc_cache_lookups_total.labels(result="hit").inc()
+    return entry[0], entry[3], entry[4]
+
+
+def put(doc_id: str, owner_id: str, generation: int | None, etag: str, body: bytes):
+    """
+    Caches a rendered document built while `generation` was the owner's current
+    one. generation=None (it was read too late to vouch for the body) only
+    records the owner, so the next request can validate in the right order.
+    """
+    global _size
+    if doc_id in _entries:
+        _drop(doc_id)
+    size = _entry_size(doc_id, body)
+    if size > settings.DOC_CACHE_MAX_BYTES:
+        return
+    _entries[doc_id] = (owner_id, generation, time.monotonic() + settings.DOC_CACHE_TTL_SECONDS, etag, body)
+    _size += size
+    while len(_entries) > settings.DOC_CACHE_MAX_ENTRIES or _size > settings.DOC_CACHE_MAX_BYTES:
+        _drop(next(iter(_entries)))
+    _update_gauges()
+
+
+def clear():
+    global _size
+    _entries.clear()
+    _size = 0
+    _update_gauges()
@@ -0,0 +1,94 @@
+from app.config import settings
+from app.responses import dumps
+from services.compression import unpack_text
+from datetime import datetime
+import csv, io
+
+EXPORT_FIELDS = [
+    "id", "filename", "mime", "ownerId", "createdAt",
+    "tags", "classification", "unsubscribeTarget", "textContent",
+]
+DEFAULT_EXPORT_FIELDS = ["id", "filename", "mime", "ownerId", "createdAt", "tags", "classification"]
+
+
+def parse_fields(raw: str | None) -> list[str]:
+    if not raw:
+        return DEFAULT_EXPORT_FIELDS
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in EXPORT_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Unknown export fields: {', '.join(unknown) or raw}")
+    return fields
+
+
+def build_pipeline(match: dict, fields: list[str]) -> list[dict]:
+    """
+    Documents in insertion order with only the requested fields.
+    Tag links store documentId either as ObjectId or as its string, so both
+    forms are looked up through the indexed localField/foreignField path.
+    """
+    pipeline = [{"$match": match}, {"$sort": {"_id": 1}}]
+    if "tags" in fields:
+        pipeline += [
+            {"$addFields": {"_idStr": {"$toString": "$_id"}}},
+            {"$lookup": {"from": "document_tags", "localField": "_id", "foreignField": "documentId", "as": "l1"}},
+            {"$lookup": {"from": "document_tags", "localField": "_idStr", "foreignField": "documentId", "as": "l2"}},
+            {"$addFields": {"tagIds": {"$concatArrays": ["$l1.tagId", "$l2.tagId"]}}},
+            {"$lookup": {"from": "tags", "localField": "tagIds", "foreignField": "_id", "as": "tagDocs"}},
+        ]
+    project = {"_id": 0, "id": {"$toString": "$_id"}}
+    for f in fields:
+        if f == "tags":
+            project["tags"] = "$tagDocs.name"
+        elif f == "textContent":
+            project.update(textContent=1, textContentZ=1, textContentEncoding=1)
+        elif f != "id":
+            project[f] = 1
+    pipeline.append({"$project": project})
+    return pipeline
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return "|".join(str(v) for v in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def stream_rows(cursor, fields: list[str], fmt: str):
+    """
+    Yields encoded chunks of about EXPORT_BATCH_SIZE rows each, so memory use
+    stays bounded by one batch no matter how many documents match.
+    """
+    batch_size = settings.EXPORT_BATCH_SIZE
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    lines = []
+    rows = 0
+
+    if writer:
+        writer.writerow(fields)
+
+    async for doc in cursor:
+        unpack_text(doc)
+        if writer:
+            writer.writerow([_csv_value(doc.get(f)) for f in fields])
+        else:
+            lines.append(dumps({f: doc.get(f) for f in fields}))
+        rows += 1
+        if rows % batch_size == 0:
+            if writer:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+
+    if writer:
+        yield buffer.getvalue().encode("utf-8")
+    elif lines:
+        yield b"\n".join(lines) + b"\n"
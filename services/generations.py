@@ -0,0 +1,21 @@
+from pymongo import UpdateOne
+
+GLOBAL_GENERATION = "global"
+
+
+async def bump(db, owner_id: str):
+    """
+    Marks everything derived from the owner's documents and tags as stale.
+    Call this after any document, tag or OCR-text write. The global generation
+    moves too, for views that span all owners.
+    """
+    await db.generations.bulk_write(
+        [UpdateOne({"_id": gid}, {"$inc": {"gen": 1}}, upsert=True) for gid in (owner_id, GLOBAL_GENERATION)],
+        ordered=False,
+    )
+
+
+async def current(db, owner_id: str | None) -> int:
+    """The owner's generation, or the global one for owner_id=None. Shared by all workers."""
+    doc = await db.generations.find_one({"_id": owner_id or GLOBAL_GENERATION})
+    return doc["gen"] if doc else 0
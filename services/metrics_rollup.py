@@ -0,0 +1,124 @@
+from app.config import settings
+from datetime import datetime, timezone, timedelta
+from pymongo import UpdateOne
+from services.audit import count_events
+import time
+
+GLOBAL_ROLLUP = "global"
+
+# rollup id -> (expires_at, metrics)
+_cache: dict = {}
+
+
+def _rollup_id(owner_id: str | None) -> str:
+    return GLOBAL_ROLLUP if owner_id is None else f"owner:{owner_id}"
+
+
+def _periods():
+    now = datetime.now(timezone.utc)
+    return now.strftime("%Y-%m"), now.strftime("%Y-%m-%d")
+
+
+def invalidate(owner_id: str | None = None):
+    _cache.pop(_rollup_id(owner_id), None)
+    _cache.pop(GLOBAL_ROLLUP, None)
+
+
+async def record(db, owner_id: str, docs: int = 0, folders: int = 0, actions: int = 0, tasks: int = 0):
+    """
+    Adds to the owner's rollup and the global rollup in one bulk write.
+    Call this next to every write that changes a /v1/metrics number.
+    """
+    month, day = _periods()
+    inc = {}
+    if docs:
+        inc["docs_total"] = docs
+    if folders:
+        inc["folders_total"] = folders
+    if actions:
+        inc[f"actions_month.{month}"] = actions
+    if tasks:
+        inc[f"tasks_today.{day}"] = tasks
+    if not inc:
+        return
+
+    await db.metric_rollups.bulk_write(
+        [UpdateOne({"_id": rid}, {"$inc": inc}, upsert=True) for rid in (_rollup_id(owner_id), GLOBAL_ROLLUP)],
+        ordered=False,
+    )
+    invalidate(owner_id)
+
+
+async def reconcile(db, owner_id: str | None = None) -> dict:
+    """
+    Recomputes a rollup from the source collections and stores it.
+    Older months/days are dropped from the rollup here.
+    """
+    now = datetime.now(timezone.utc)
+    month, day = _periods()
+    start_month = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+    start_day = datetime(now.year, now.month, now.day)
+    owner_filter = {} if owner_id is None else {"ownerId": owner_id}
+    user_filter = {} if owner_id is None else {"userId": owner_id}
+
+    docs_total = await db.documents.count_documents(owner_filter)
+    folders_total = await db.tags.count_documents(owner_filter)
+    actions_month = await count_events(db, "run_actions", start_month, owner_id)
+    tasks_today = await db.tasks.count_documents({**user_filter, "createdAt": {"$gte": start_day}})
+
+    await db.metric_rollups.update_one(
+        {"_id": _rollup_id(owner_id)},
+        {"$set": {
+            "docs_total": docs_total,
+            "folders_total": folders_total,
+            "actions_month": {month: actions_month},
+            "tasks_today": {day: tasks_today},
+            "reconciledAt": now,
+        }},
+        upsert=True,
+    )
+    return {
+        "docs_total": docs_total,
+        "folders_total": folders_total,
+        "actions_month": actions_month,
+        "tasks_today": tasks_today,
+    }
+
+
+def _is_stale(rollup: dict) -> bool:
+    reconciled_at = rollup.get("reconciledAt")
+    if reconciled_at is None:
+        return True
+    if reconciled_at.tzinfo is None:
+        reconciled_at = reconciled_at.replace(tzinfo=timezone.utc)
+    age = datetime.now(timezone.utc) - reconciled_at
+    return age > timedelta(seconds=settings.METRICS_RECONCILE_SECONDS)
+
+
+async def get_metrics(db, owner_id: str | None = None) -> dict:
+    """
+    Metrics for one owner, or global ones when owner_id is None.
+    Served from the in-process cache, then the rollup document; the rollup is
+    reconciled against the source collections when missing or stale.
+    """
+    key = _rollup_id(owner_id)
+    hit = _cache.get(key)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+
+    rollup = await db.metric_rollups.find_one({"_id": key})
+    if not rollup or _is_stale(rollup):
+        result = await reconcile(db, owner_id)
+    else:
+        month, day = _periods()
+        result = {
+            "docs_total": rollup.get("docs_total", 0),
+            "folders_total": rollup.get("folders_total", 0),
+            "actions_month": rollup.get("actions_month", {}).get(month, 0),
+            "tasks_today": rollup.get("tasks_today", {}).get(day, 0),
+        }
+
+    if len(_cache) >= settings.METRICS_CACHE_MAX_ENTRIES:
+        _cache.pop(next(iter(_cache)))
+    _cache[key] = (time.monotonic() + settings.METRICS_CACHE_TTL_SECONDS, result)
+    return result
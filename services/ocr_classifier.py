@@ -3,6 +3,33 @@ import re
 PROMO = ["sale", "unsubscribe", "offer", "limited time", "buy now", "subscribe", "promo", "discount"]
 OFFICIAL = ["invoice", "amount due", "contract", "legal", "bank", "payment", "statement", "due date"]
 
+# --- Unsubscribe extraction ---
+# Only text within this many characters of an "unsubscribe"/"opt out" cue is scanned
+CUE_WINDOW_BEFORE = 200
+CUE_WINDOW_AFTER = 400
+# A target crossing the window edge may run on for at most this many characters
+MAX_TARGET_LENGTH = 256
+
+_CUE_RE = re.compile(r"unsubscribe|opt[\s\-]?out", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s")
+
+# One alternation, tried once per position. The lookbehind on the email branch stops it
+# from restarting inside a run of address characters, so the scan stays linear.
+_TARGET_RE = re.compile(
+    r"mailto:(?P<mailto>[\w.+\-@]+)"
+    r"|(?P<url>https?://[^\s,]+)"
+    r"|(?<![\w.%+\-])(?P<email>[\w.%+\-]+@[A-Za-z0-9.\-]+)",
+    re.IGNORECASE,
+)
+_TLD_RE = re.compile(r"[A-Za-z]{2,}")
+
+_TRAILING_PUNCT = ".,;:!?)]}>'\""
+
+BASE_CONFIDENCE = {"mailto": 0.95, "email": 0.85, "url": 0.75}
+UNSUB_URL_BONUS = 0.1
+NO_CUE_PENALTY = 0.3
+
+
 def classify_text(text: str) -> str:
     t = text.lower()
     if any(w in t for w in OFFICIAL):
@@ -11,23 +38,79 @@ def classify_text(text: str) -> str:
         return "ad"
     return "other"
 
-def extract_unsubscribe(text: str):
 
-    normalized = text.replace("\n", " ").replace("\r", " ")
+def _cue_windows(text: str):
+    """Merged (start, end) spans around every unsubscribe cue in the text."""
+    windows = []
+    for m in _CUE_RE.finditer(text):
+        start = max(0, m.start() - CUE_WINDOW_BEFORE)
+        end = min(len(text), m.end() + CUE_WINDOW_AFTER)
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], end)
+        else:
+            windows.append((start, end))
+    return windows
+
+
+def _extend_to_boundary(text: str, end: int) -> int:
+    """Push a window end to the next whitespace so a target is not cut in half."""
+    limit = min(len(text), end + MAX_TARGET_LENGTH)
+    m = _WHITESPACE_RE.search(text, end, limit)
+    return m.start() if m else limit
 
-    m = re.search(r"mailto:([\w\.\-+@]+)", normalized, re.IGNORECASE)
-    if m:
-        return {"type": "email", "value": m.group(1)}
 
-    email_fallback = re.search(
-        r"([A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})",
-        normalized
-    )
-    if email_fallback:
-        return {"type": "email", "value": email_fallback.group(1)}
+def _valid_email(value: str) -> bool:
+    local, _, domain = value.rpartition("@")
+    if not local or "." not in domain:
+        return False
+    return bool(_TLD_RE.fullmatch(domain.rsplit(".", 1)[1]))
 
-    m = re.search(r"(https?://[^\s,]+)", normalized, re.IGNORECASE)
-    if m:
-        return {"type": "url", "value": m.group(1)}
 
-    return None
\ No newline at end of file
+def _scan(text: str, start: int, end: int, in_window: bool, found: dict):
+    for m in _TARGET_RE.finditer(text, start, end):
+        kind = m.lastgroup
+        value = m.group(kind).rstrip(_TRAILING_PUNCT)
+        if kind in ("mailto", "email") and not _valid_email(value):
+            continue
+
+        confidence = BASE_CONFIDENCE[kind]
+        if kind == "url" and ("unsub" in value.lower() or "optout" in value.lower()):
+            confidence += UNSUB_URL_BONUS
+        if not in_window:
+            confidence -= NO_CUE_PENALTY
+
+        channel = "url" if kind == "url" else "email"
+        key = (channel, value.lower())
+        if key not in found or found[key]["confidence"] < confidence:
+            found[key] = {
+                "type": channel,
+                "value": value,
+                "confidence": round(confidence, 2),
+                "position": m.start(kind),
+            }
+
+
+def extract_unsubscribe_candidates(text: str) -> list[dict]:
+    """
+    Returns every unsubscribe target found in the text, best first.
+    Each candidate is {"type": "email"|"url", "value", "confidence", "position"}.
+    Text near an "unsubscribe" cue is scanned; without any cue the whole
+    text is scanned and candidates get a lower confidence.
+    """
+    if not text:
+        return []
+
+    found = {}
+    windows = _cue_windows(text)
+    if windows:
+        for start, end in windows:
+            _scan(text, start, _extend_to_boundary(text, end), True, found)
+    else:
+        _scan(text, 0, len(text), False, found)
+
+    return sorted(found.values(), key=lambda c: (-c["confidence"], c["position"]))
+
+
+def extract_unsubscribe(text: str):
+    candidates = extract_unsubscribe_candidates(text)
+    return candidates[0] if candidates else None
@@ -0,0 +1,71 @@
+from app.config import settings
+from datetime import datetime, timezone
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+def daily_key(*parts: str) -> str:
+    """Builds a rate-limit key scoped to the current UTC day."""
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    return ":".join([*parts, today])
+
+
+async def ensure_rate_limit_indexes(db):
+    """
+    The unique index on `key` is what turns a blocked upsert into a rejection,
+    and the TTL index on `createdAt` cleans up old daily counters.
+    """
+    await db.rate_limits.create_index([("key", ASCENDING)], unique=True)
+    await db.rate_limits.create_index(
+        [("createdAt", ASCENDING)], expireAfterSeconds=settings.RATE_LIMIT_TTL_SECONDS
+    )
+
+
+async def consume_quota(db, key: str, limit: int, amount: int = 1):
+    """
+    Atomically takes `amount` units from the counter at `key` if that keeps it within `limit`.
+    Returns (allowed, count) where count is the counter value after the call
+    (None when rejected, since the counter was left untouched).
+
+    One round trip in the common case: the filter only matches while there is
+    room, and when it does not match the upsert collides with the unique key
+    index. The server does not retry that collision for a range filter, so two
+    first requests for a fresh key race on the insert; the loser retries once
+    without upsert and is only rejected if the existing counter has no room.
+    """
+    if amount > limit:
+        return False, None
+    query = {"key": key, "count": {"$lte": limit - amount}}
+    update = {"$inc": {"count": amount}, "$setOnInsert": {"createdAt": datetime.now(timezone.utc)}}
+    try:
+        res = await db.rate_limits.find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        res = await db.rate_limits.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+        if res is None:
+            return False, None
+    return True, res["count"]
+
+
+async def consume_quota_upto(db, key: str, limit: int, wanted: int):
+    """
+    Takes as many of `wanted` units as the quota allows.
+    Returns (granted, count) with count being the counter value after the last granted unit.
+
+    When the whole batch does not fit, the remaining room is read once and taken
+    with a single conditional increment; that is only repeated if a concurrent
+    request moved the counter in between.
+    """
+    allowed, count = await consume_quota(db, key, limit, wanted)
+    if allowed:
+        return wanted, count
+
+    while True:
+        current = await db.rate_limits.find_one({"key": key}, {"count": 1})
+        room = min(wanted, limit - (current or {}).get("count", 0))
+        if room <= 0:
+            return 0, None
+        allowed, count = await consume_quota(db, key, limit, room)
+        if allowed:
+            return room, count
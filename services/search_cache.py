@@ -0,0 +1,65 @@
+from app.config import settings
+from app.metrics_registry import search_cache_lookups_total, search_cache_bytes, search_cache_entries
+from collections import OrderedDict
+import time
+
+# key -> (generation, expires_at, status, body)
+_entries: OrderedDict = OrderedDict()
+_size = 0
+
+
+def make_key(owner_id: str | None, q: str, scope: str | None, ids: list[str]) -> tuple:
+    """owner_id=None is the admin (all owners) view."""
+    return owner_id or "*", q.lower().strip(), scope or "", tuple(sorted(set(ids)))
+
+
+def _entry_size(key, body) -> int:
+    return len(body) + sum(len(part) if isinstance(part, str) else 64 for part in key) + 128
+
+
+def _drop(key):
+    global _size
+    _, _, _, body = _entries.pop(key)
+    _size -= _entry_size(key, body)
+
+
+def _update_gauges():
+    search_cache_bytes.set(_size)
+    search_cache_entries.set(len(_entries))
+
+
+def get(key, generation: int):
+    """(status, body) if cached for this generation, else None. Outdated entries are dropped on sight."""
+    entry = _entries.get(key)
+    if entry is not None and (entry[0] != generation or entry[1] < time.monotonic()):
+        _drop(key)
+        _update_gauges()
+        entry = None
+    if entry is None:
+        search_cache_lookups_total.labels(result="miss").inc()
+        return None
+    _entries.move_to_end(key)
+    search_cache_lookups_total.labels(result="hit").inc()
+    return entry[2], entry[3]
+
+
+def put(key, generation: int, status: int, body):
+    """Caches a rendered result (or a 404 detail) computed while `generation` was current."""
+    global _size
+    if key in _entries:
+        _drop(key)
+    size = _entry_size(key, body)
+    if size > settings.SEARCH_CACHE_MAX_BYTES:
+        return
+    _entries[key] = (generation, time.monotonic() + settings.SEARCH_CACHE_TTL_SECONDS, status, body)
+    _size += size
+    while len(_entries) > settings.SEARCH_CACHE_MAX_ENTRIES or _size > settings.SEARCH_CACHE_MAX_BYTES:
+        _drop(next(iter(_entries)))
+    _update_gauges()
+
+
+def clear():
+    global _size
+    _entries.clear()
+    _size = 0
+    _update_gauges()
@@ -0,0 +1,112 @@
+"""
+Per-worker cache of (ownerId, tag name) -> tag _id, filled on lookup and on
+upsert. Entries expire after TAG_CACHE_TTL_SECONDS; verify_forever re-checks
+every cached id in batched queries so a tag renamed or deleted through another
+worker is noticed within TAG_CACHE_VERIFY_SECONDS.
+"""
+from app.config import settings
+from app.metrics_registry import tag_cache_lookups_total, tag_cache_stale_total
+from app.utils import now
+from bson import ObjectId
+from collections import OrderedDict
+from pymongo import ReturnDocument
+import asyncio, time
+
+VERIFY_BATCH = 1000
+
+# (ownerId, name) -> (tag _id, expires_at)
+_entries: OrderedDict = OrderedDict()
+
+
+def _get(owner_id: str, name: str):
+    key = (owner_id, name)
+    entry = _entries.get(key)
+    if entry is None or entry[1] < time.monotonic():
+        if entry is not None:
+            del _entries[key]
+        tag_cache_lookups_total.labels(result="miss").inc()
+        return None
+    _entries.move_to_end(key)
+    tag_cache_lookups_total.labels(result="hit").inc()
+    return entry[0]
+
+
+def put(owner_id: str, name: str, tag_id):
+    key = (owner_id, name)
+    _entries[key] = (tag_id, time.monotonic() + settings.TAG_CACHE_TTL_SECONDS)
+    _entries.move_to_end(key)
+    while len(_entries) > settings.TAG_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+
+def invalidate(owner_id: str, name: str):
+    """Call after renaming or deleting a tag; other workers find out through verify()."""
+    _entries.pop((owner_id, name), None)
+
+
+def clear():
+    _entries.clear()
+
+
+async def resolve(db, owner_id: str | None, name: str):
+    """
+    The tag _id for `name`, or None. owner_id=None is the admin lookup by name
+    across owners, which goes to the database. Only existing tags are cached.
+    """
+    if owner_id is None:
+        tag = await db.tags.find_one({"name": name}, {"_id": 1})
+        return tag["_id"] if tag else None
+    tag_id = _get(owner_id, name)
+    if tag_id is None:
+        tag = await db.tags.find_one({"ownerId": owner_id, "name": name}, {"_id": 1})
+        if tag is None:
+            return None
+        tag_id = tag["_id"]
+        put(owner_id, name, tag_id)
+    return tag_id
+
+
+async def get_or_create(db, owner_id: str, name: str) -> tuple[ObjectId, bool]:
+    """(tag _id, created). A cache hit skips the database entirely."""
+    tag_id = _get(owner_id, name)
+    if tag_id is not None:
+        return tag_id, False
+    # a pre-generated _id tells us whether the upsert created the tag
+    new_id = ObjectId()
+    tag = await db.tags.find_one_and_update(
+        {"ownerId": owner_id, "name": name},
+        {"$setOnInsert": {"_id": new_id, "createdAt": now()}},
+        upsert=True,
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    put(owner_id, name, tag["_id"])
+    return tag["_id"], tag["_id"] == new_id
+
+
+async def verify(db) -> int:
+    """Drops entries whose tag was deleted or renamed; returns how many there were."""
+    stale = 0
+    keys = list(_entries)
+    for i in range(0, len(keys), VERIFY_BATCH):
+        batch = {_entries[k][0]: k for k in keys[i:i + VERIFY_BATCH] if k in _entries}
+        current = {
+            t["_id"]: (t.get("ownerId"), t.get("name"))
+            async for t in db.tags.find({"_id": {"$in": list(batch)}}, {"ownerId": 1, "name": 1})
+        }
+        for tag_id, key in batch.items():
+            if current.get(tag_id) != key:
+                _entries.pop(key, None)
+                stale += 1
+    if stale:
+        tag_cache_stale_total.inc(stale)
+    return stale
+
+
+async def verify_forever(db):
+    while True:
+        await asyncio.sleep(settings.TAG_CACHE_VERIFY_SECONDS)
+        try:
+            await verify(db)
+        except Exception as e:
+            print("Warning: tag cache verification failed:", e)
@@ -0,0 +1,85 @@
+from app.config import settings
+from app.tracing import span
+from concurrent.futures import ProcessPoolExecutor
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+import asyncio, io
+
+THUMBNAIL_SIZES = (128, 256, 512)
+THUMBNAIL_MIMES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+THUMBNAIL_MIME = "image/jpeg"
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def render_thumbnails(data: bytes, sizes=THUMBNAIL_SIZES) -> dict[int, bytes]:
+    """
+    JPEG thumbnails bounded by each size, aspect ratio kept, never upscaled.
+    Runs in a worker process, so it only takes and returns plain bytes.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (max(sizes), max(sizes)))  # cheap JPEG downscale on decode
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, "white")
+        background.paste(img, mask=img.getchannel("A"))
+
+    out = {}
+    for size in sorted(sizes, reverse=True):
+        background.thumbnail((size, size), Image.LANCZOS)
+        buf = io.BytesIO()
+        background.save(buf, "JPEG", quality=settings.THUMBNAIL_QUALITY, optimize=True)
+        out[size] = buf.getvalue()
+    return out
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def generate_thumbnails(db, doc_id, data: bytes) -> dict[str, object] | None:
+    """
+    Renders every size in the pool, stores them in GridFS and links them on the
+    document as `thumbnails.{size}`. Returns the links, or None for images
+    Pillow cannot read. If another request linked thumbnails first, ours are
+    dropped and theirs returned.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        with span("thumbnails.render", phase="thumbnails", bytes=len(data)):
+            rendered = await loop.run_in_executor(get_pool(), render_thumbnails, data)
+    except Exception as e:
+        print("Warning: thumbnail rendering failed for", doc_id, e)
+        await db.documents.update_one(
+            {"_id": doc_id, "thumbnails": {"$exists": False}}, {"$set": {"thumbnails": {}}}
+        )
+        return None
+
+    fs = AsyncIOMotorGridFSBucket(db)
+    links = {}
+    with span("gridfs.write", phase="gridfs", bytes=sum(map(len, rendered.values()))):
+        for size, jpeg in rendered.items():
+            links[str(size)] = await fs.upload_from_stream(
+                f"thumb-{doc_id}-{size}.jpg", jpeg,
+                metadata={"documentId": doc_id, "size": size, "contentType": THUMBNAIL_MIME},
+            )
+
+    result = await db.documents.update_one(
+        {"_id": doc_id, "thumbnails": {"$exists": False}}, {"$set": {"thumbnails": links}}
+    )
+    if result.modified_count == 0:
+        for file_id in links.values():
+            await fs.delete(file_id)
+        doc = await db.documents.find_one({"_id": doc_id}, {"thumbnails": 1})
+        return (doc or {}).get("thumbnails")
+    return links
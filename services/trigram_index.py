@@ -0,0 +1,131 @@
+"""
+Trigram index over each owner's vocabulary: the words in their filenames and
+their tag names. Tenants have far fewer distinct terms than documents, so a
+suggestion query only touches the handful of terms sharing a trigram with it.
+
+Backfill documents uploaded before the index existed with:
+
+    python -m services.trigram_index
+"""
+from app.config import settings
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+import asyncio, re
+
+_WORD_RE = re.compile(r"[^\W_]+")
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+
+
+def trigrams(text: str) -> list[str]:
+    """pg_trgm style: every word is padded with two leading and one trailing blank."""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return sorted(grams)
+
+
+def filename_terms(filename: str | None) -> set[str]:
+    """Words of the filename without its extension; bare numbers are left out."""
+    stem = (filename or "").rsplit(".", 1)[0]
+    return {
+        w for w in _WORD_RE.findall(stem.lower())
+        if MIN_TERM_LENGTH <= len(w) <= MAX_TERM_LENGTH and not w.isdigit()
+    }
+
+
+def _term_updates(owner_id: str, filename: str | None, tags) -> list[UpdateOne]:
+    entries = {("filename", t) for t in filename_terms(filename)}
+    entries |= {("tag", t.strip().lower()) for t in tags if t and t.strip()}
+    return [
+        UpdateOne(
+            {"ownerId": owner_id, "kind": kind, "term": term},
+            {"$inc": {"count": 1}, "$setOnInsert": {"trigrams": trigrams(term)}},
+            upsert=True,
+        )
+        for kind, term in entries
+    ]
+
+
+async def ensure_trigram_indexes(db):
+    await db.suggest_terms.create_index(
+        [("ownerId", ASCENDING), ("kind", ASCENDING), ("term", ASCENDING)], unique=True
+    )
+    # serves both the per-owner lookup and the admin (all owners) one
+    await db.suggest_terms.create_index([("trigrams", ASCENDING), ("ownerId", ASCENDING)])
+
+
+async def index_document(db, owner_id: str, filename: str | None, tags=()):
+    """Adds one document's filename words and tags to the owner's vocabulary."""
+    updates = _term_updates(owner_id, filename, tags)
+    if updates:
+        await db.suggest_terms.bulk_write(updates, ordered=False)
+
+
+async def suggest(db, owner_id: str | None, q: str, limit: int = 10) -> list[dict]:
+    """
+    Terms ranked by how much of the query they cover (tolerates typos and
+    unfinished words), then by trigram Jaccard similarity, then by how many
+    documents use them. owner_id=None searches every owner.
+    """
+    grams = trigrams(q)
+    if not grams:
+        return []
+    match = {"trigrams": {"$in": grams}}
+    if owner_id is not None:
+        match["ownerId"] = owner_id
+
+    shared = {"$size": {"$setIntersection": ["$trigrams", grams]}}
+    pipeline = [
+        {"$match": match},
+        {"$project": {"kind": 1, "term": 1, "count": 1, "size": {"$size": "$trigrams"}, "shared": shared}},
+        {"$addFields": {
+            "score": {"$divide": ["$shared", len(grams)]},
+            "similarity": {"$divide": ["$shared", {"$subtract": [{"$add": ["$size", len(grams)]}, "$shared"]}]},
+        }},
+        {"$match": {"score": {"$gte": settings.SUGGEST_MIN_SCORE}}},
+        {"$group": {
+            "_id": {"kind": "$kind", "term": "$term"},
+            "count": {"$sum": "$count"},
+            "score": {"$first": "$score"},
+            "similarity": {"$first": "$similarity"},
+        }},
+        {"$sort": {"score": DESCENDING, "similarity": DESCENDING, "count": DESCENDING}},
+        {"$limit": limit},
+        {"$project": {
+            "_id": 0, "term": "$_id.term", "kind": "$_id.kind", "count": 1,
+            "score": {"$round": ["$score", 3]}, "similarity": {"$round": ["$similarity", 3]},
+        }},
+    ]
+    return await db.suggest_terms.aggregate(pipeline).to_list(limit)
+
+
+async def rebuild(db):
+    """Recomputes the whole vocabulary from documents and tag links."""
+    await db.suggest_terms.delete_many({})
+    await ensure_trigram_indexes(db)
+    pipeline = [
+        {"$project": {"ownerId": 1, "filename": 1, "_idStr": {"$toString": "$_id"}}},
+        {"$lookup": {"from": "document_tags", "localField": "_id", "foreignField": "documentId", "as": "l1"}},
+        {"$lookup": {"from": "document_tags", "localField": "_idStr", "foreignField": "documentId", "as": "l2"}},
+        {"$lookup": {"from": "tags", "localField": "l1.tagId", "foreignField": "_id", "as": "t1"}},
+        {"$lookup": {"from": "tags", "localField": "l2.tagId", "foreignField": "_id", "as": "t2"}},
+        {"$project": {"ownerId": 1, "filename": 1, "tags": {"$concatArrays": ["$t1.name", "$t2.name"]}}},
+    ]
+    batch, indexed = [], 0
+    async for doc in db.documents.aggregate(pipeline, allowDiskUse=True):
+        batch += _term_updates(doc.get("ownerId"), doc.get("filename"), doc.get("tags", []))
+        indexed += 1
+        if len(batch) >= 1000:
+            await db.suggest_terms.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.suggest_terms.bulk_write(batch, ordered=False)
+    return indexed
+
+
+if __name__ == "__main__":
+    from app.db import get_client
+
+    count = asyncio.run(rebuild(get_client()[settings.DB_NAME]))
+    print(f"Indexed {count} documents")
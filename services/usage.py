@@ -1,18 +1,9 @@
-from app.db import get_client
-from app.config import settings
 from datetime import datetime, timezone
 
 DEFAULT_CREDIT_LIMIT = 50
 
 
-def _fallback_db():
-    return get_client()[settings.DB_NAME]
-
-
-async def charge_user(user_id: str, credits: int, db=None):
-    if db is None:
-        db = _fallback_db()
-
+async def charge_user(user_id: str, credits: int, db):
     await db.usage.insert_one({
         "userId": user_id,
         "credits": credits,
@@ -20,10 +11,7 @@ async def charge_user(user_id: str, credits: int, db=None):
     })
 
 
-async def get_monthly_usage(user_id: str, db=None):
-    if db is None:
-        db = _fallback_db()
-
+async def get_monthly_usage(user_id: str, db):
     now = datetime.now(timezone.utc)
     start = datetime(now.year, now.month, 1)
 
@@ -39,9 +27,6 @@ async def get_monthly_usage(user_id: str, db=None):
     return total
 
 
-async def get_remaining_credits(user_id: str, db=None) -> int:
-    if db is None:
-        db = _fallback_db()
-
+async def get_remaining_credits(user_id: str, db) -> int:
     used = await get_monthly_usage(user_id, db=db)
     return max(0, DEFAULT_CREDIT_LIMIT - used)
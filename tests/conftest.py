@@ -1,12 +1,16 @@
 from httpx import ASGITransport, AsyncClient
 import pytest
 import pytest_asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
 from app.main import app
 from app.config import settings
 from datetime import datetime, timedelta
 import jwt
-from app.db import get_db
+from app.db import get_db, create_client, ensure_core_indexes
+from services.rate_limit import ensure_rate_limit_indexes
+from services.audit import ensure_audit_collections
+from services import doc_cache, search_cache, tag_cache
+from services.blobs import ensure_blob_indexes
+from services.trigram_index import ensure_trigram_indexes
 
 TEST_DB_NAME = "test_assignment"
 
@@ -15,12 +19,21 @@ async def test_db():
     """
     Create an isolated test DB for every test.
     """
-    client = AsyncIOMotorClient(settings.MONGO_URI)
+    client = create_client()
     db = client[TEST_DB_NAME]
 
     # clean before test
     for name in await db.list_collection_names():
         await db[name].delete_many({})
+    await ensure_core_indexes(db)
+    await ensure_rate_limit_indexes(db)
+    await ensure_audit_collections(db)
+    await ensure_trigram_indexes(db)
+    await ensure_blob_indexes(db)
+    # generations restart at 0 in the fresh DB, so drop results cached by earlier tests
+    search_cache.clear()
+    doc_cache.clear()
+    tag_cache.clear()
 
     yield db
 
@@ -0,0 +1,60 @@
+import os
+from app import active_users
+from app.active_users import HyperLogLog, SlidingDistinctCounter, decode, encode, hash_value, publish
+from prometheus_client import REGISTRY
+
+
+def test_hyperloglog_estimate_and_merge():
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(30000):
+        a.add(f"user-{i}")
+    for i in range(20000, 50000):
+        b.add(f"user-{i}")
+
+    assert abs(a.count() - 30000) / 30000 < 0.05
+    assert abs(a.merge(b).count() - 50000) / 50000 < 0.05
+    assert len(a.registers) == 4096  # fixed memory regardless of cardinality
+
+    small = HyperLogLog()
+    for i in range(10):
+        small.add(f"u{i}")
+        small.add(f"u{i}")
+    assert round(small.count()) == 10
+
+
+def test_sliding_window_drops_old_buckets():
+    counter = SlidingDistinctCounter(window=60, buckets=12)
+    for i in range(100):
+        counter.add_hash(hash_value(f"early-{i}"), now=1000)
+    for i in range(50):
+        counter.add_hash(hash_value(f"late-{i}"), now=1030)
+
+    assert abs(counter.count(now=1030) - 150) < 5
+    assert abs(counter.count(now=1065) - 50) < 3  # the t=1000 bucket has left the window
+    counter.expire(now=1100)
+    assert counter.buckets == {}
+
+
+def test_workers_merge_through_sketch_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(active_users.settings, "ACTIVE_USERS_SKETCH_DIR", str(tmp_path))
+    now = 1_700_000_000
+
+    # another worker saw users 0..299
+    peer = {name: SlidingDistinctCounter(s, b) for name, (s, b) in active_users.WINDOWS.items()}
+    for i in range(300):
+        for counter in peer.values():
+            counter.add_hash(hash_value(f"user-{i}"), now)
+    (tmp_path / "active_users_1.hll").write_bytes(encode(peer, now))
+
+    # this worker saw users 200..499
+    monkeypatch.setattr(active_users, "_counters", {
+        name: SlidingDistinctCounter(s, b) for name, (s, b) in active_users.WINDOWS.items()
+    })
+    for i in range(200, 500):
+        active_users.record(f"user-{i}", now=now)
+
+    estimates = publish(encode(active_users._counters, now), now)
+    assert all(abs(v - 500) / 500 < 0.05 for v in estimates.values())
+    assert REGISTRY.get_sample_value("active_users", {"window": "24h"}) == round(estimates["24h"])
+    assert (tmp_path / f"active_users_{os.getpid()}.hll").exists()
+    assert set(decode((tmp_path / "active_users_1.hll").read_bytes())) == {0, 1, 2}
@@ -0,0 +1,58 @@
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from services import blobs
+
+
+async def test_identical_uploads_share_one_file(client, make_token, test_db):
+    token = make_token("bl1", "bl@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    for name in ("scan-1.png", "scan-2.png"):
+        res = await client.post(
+            "/v1/docs", headers=headers,
+            data={"primaryTag": "scans"}, files={"file": (name, b"same bytes", "image/png")},
+        )
+        assert res.status_code == 200
+
+    docs = await test_db.documents.find({"ownerId": "bl1"}).to_list(None)
+    assert len({d["gridfsId"] for d in docs}) == 1
+    assert await test_db["fs.files"].count_documents({"metadata.sha256": {"$exists": True}}) == 1
+    blob = await test_db.blobs.find_one({})
+    assert blob["refs"] == 2
+
+    # both documents still download the shared bytes
+    res = await client.get(f"/v1/docs/{docs[1]['_id']}/download", headers=headers)
+    assert res.content == b"same bytes"
+
+
+async def test_release_deletes_with_last_reference(test_db):
+    file_id = await blobs.store(test_db, b"abc", "a.txt", {})
+    assert await blobs.store(test_db, b"abc", "b.txt", {}) == file_id
+
+    assert await blobs.release(test_db, file_id) is False
+    assert await test_db["fs.files"].count_documents({"_id": file_id}) == 1
+    assert await blobs.release(test_db, file_id) is True
+    assert await test_db["fs.files"].count_documents({"_id": file_id}) == 0
+    assert await test_db.blobs.count_documents({}) == 0
+
+
+async def test_sweep_folds_existing_duplicates(test_db):
+    fs = AsyncIOMotorGridFSBucket(test_db)
+    first = await fs.upload_from_stream("old-1.png", b"legacy")
+    second = await fs.upload_from_stream("old-2.png", b"legacy")
+    other = await fs.upload_from_stream("old-3.png", b"different")
+    await test_db.documents.insert_many([
+        {"ownerId": "bl2", "filename": "old-1.png", "gridfsId": first},
+        {"ownerId": "bl2", "filename": "old-2.png", "gridfsId": second},
+        {"ownerId": "bl2", "filename": "old-3.png", "gridfsId": other},
+    ])
+
+    stats = await blobs.dedupe_existing(test_db)
+    assert stats == {"scanned": 3, "merged": 1, "bytes_freed": len(b"legacy")}
+    assert await test_db["fs.files"].count_documents({}) == 2
+    ids = {d["gridfsId"] for d in await test_db.documents.find({"filename": {"$in": ["old-1.png", "old-2.png"]}}).to_list(None)}
+    assert len(ids) == 1
+    assert (await test_db.blobs.find_one({"gridfsId": ids.pop()}))["refs"] == 2
+
+    # a second pass has nothing left to hash
+    assert (await blobs.dedupe_existing(test_db))["scanned"] == 0
+    # and new uploads of the same bytes join the swept blob
+    assert await blobs.store(test_db, b"different", "new.png", {}) == other
@@ -0,0 +1,65 @@
+import pytest
+from services import blobs, compression
+from app.utils import now
+
+
+async def _chunks(data, size=7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+@pytest.mark.parametrize("codec", ["zstd", "gzip"])
+async def test_round_trip(monkeypatch, codec):
+    monkeypatch.setattr(compression.settings, "COMPRESSION_AT_REST", codec)
+    data = b"vendor,total\n" + b"acme,100\n" * 500
+    packed, encoding = compression.compress(data)
+    assert encoding == codec and len(packed) < len(data)
+    assert compression.decompress(packed, encoding) == data
+    assert b"".join([c async for c in compression.decompress_chunks(_chunks(packed), encoding)]) == data
+
+    # small or incompressible data is stored as is
+    assert compression.compress(b"tiny") == (b"tiny", None)
+    assert compression.pack_blob(data, "image/png") == (data, {})
+
+
+def test_pack_text_threshold(monkeypatch):
+    monkeypatch.setattr(compression.settings, "TEXT_CONTENT_COMPRESS_BYTES", 100)
+    assert compression.pack_text("short") == {"textContent": "short"}
+    assert compression.pack_text(None) == {"textContent": None}
+
+    text = "Invoice total due " * 50
+    fields = compression.pack_text(text)
+    assert fields["textContent"] is None and len(fields["textContentZ"]) < len(text)
+    assert compression.unpack_text({"_id": 1, **fields}) == {"_id": 1, "textContent": text}
+
+
+def test_accept_encoding():
+    assert compression.accepts("gzip, deflate, br", "gzip")
+    assert compression.accepts("br;q=1.0, zstd;q=0.5", "zstd")
+    assert compression.accepts("*", "zstd")
+    assert not compression.accepts("gzip;q=0", "gzip")
+    assert not compression.accepts("identity", "gzip")
+    assert not compression.accepts(None, "gzip")
+
+
+async def test_download_serves_stored_encoding(client, test_db, make_token, monkeypatch):
+    monkeypatch.setattr(compression.settings, "COMPRESSION_AT_REST", "gzip")
+    token = make_token("cz1", "cz@test.com", "user")
+    csv_bytes = b"vendor,total\n" + b"acme,100\n" * 500
+    gridfs_id = await blobs.store(test_db, csv_bytes, "report.csv", {"ownerId": "cz1", "contentType": "text/csv"})
+    stored = await test_db["fs.files"].find_one({"_id": gridfs_id})
+    assert stored["metadata"]["contentEncoding"] == "gzip"
+    assert stored["length"] < len(csv_bytes)
+
+    doc = await test_db.documents.insert_one({
+        "ownerId": "cz1", "filename": "report.csv", "mime": "text/csv", "gridfsId": gridfs_id, "createdAt": now(),
+    })
+    url = f"/v1/docs/{doc.inserted_id}/download"
+
+    res = await client.get(url, headers={"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.content == csv_bytes  # decoded by the client
+
+    res = await client.get(url, headers={"Authorization": f"Bearer {token}", "Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers
+    assert res.content == csv_bytes
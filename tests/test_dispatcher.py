@@ -0,0 +1,107 @@
+import asyncio, httpx
+from app.utils import now
+from datetime import timedelta
+from services.dispatcher import TaskDispatcher, WebUnsubscribeHandler
+
+
+def _task(channel, target):
+    return {"userId": "u1", "sender": "scanner", "status": "pending", "channel": channel,
+            "target": target, "payload": {}, "createdAt": now()}
+
+
+async def test_dispatcher_coalesces_targets(test_db):
+    await test_db.tasks.insert_many([
+        _task("email", "a@brand.com"),
+        _task("email", "A@brand.com"),
+        _task("email", "b@brand.com"),
+    ])
+    calls = []
+
+    async def fake_email(target, tasks):
+        calls.append((target.lower(), len(tasks)))
+
+    dispatcher = TaskDispatcher(test_db, handlers={"email": fake_email})
+    assert await dispatcher.run_once() == 3
+
+    assert sorted(calls) == [("a@brand.com", 2), ("b@brand.com", 1)]
+    assert await test_db.tasks.count_documents({"status": "done"}) == 3
+
+
+async def test_dispatcher_web_handler_with_local_http_stand_in(test_db):
+    await test_db.tasks.insert_one(_task("web", "https://brand.com/unsub?id=1"))
+    seen = []
+
+    def respond(request):
+        seen.append(str(request.url))
+        return httpx.Response(200)
+
+    handlers = {"web": WebUnsubscribeHandler(transport=httpx.MockTransport(respond))}
+    await TaskDispatcher(test_db, handlers=handlers).run_once()
+
+    assert seen == ["https://brand.com/unsub?id=1"]
+    assert (await test_db.tasks.find_one({}))["status"] == "done"
+
+
+async def test_dispatcher_retries_then_dead_letters(test_db):
+    await test_db.tasks.insert_one(_task("email", "x@y.com"))
+
+    async def broken(target, tasks):
+        raise ConnectionError("smtp down")
+
+    dispatcher = TaskDispatcher(test_db, handlers={"email": broken}, max_attempts=2, retry_backoff_seconds=0)
+    await dispatcher.run_once()
+    task = await test_db.tasks.find_one({})
+    assert task["status"] == "pending"
+    assert task["attempts"] == 1
+
+    await dispatcher.run_once()
+    task = await test_db.tasks.find_one({})
+    assert task["status"] == "dead"
+    assert "smtp down" in task["lastError"]
+    assert await dispatcher.run_once() == 0
+
+
+async def test_concurrent_claims_do_not_overlap(test_db):
+    await test_db.tasks.insert_many([_task("email", f"{i}@brand.com") for i in range(30)])
+    first, second = TaskDispatcher(test_db, batch_size=20), TaskDispatcher(test_db, batch_size=20)
+
+    batches = await asyncio.gather(first.claim_batch("a"), second.claim_batch("b"))
+    ids = [t["_id"] for batch in batches for t in batch]
+    # the claimer that loses a race picks again, so the queue drains without overlap
+    assert len(ids) == len(set(ids)) == 30
+    assert all(len(batch) <= 20 for batch in batches)
+    assert await test_db.tasks.count_documents({"status": "pending"}) == 0
+    assert all(t["leaseToken"] in ("a", "b") and t["attempts"] == 1 for batch in batches for t in batch)
+
+
+async def test_leases_are_renewed_while_a_batch_runs(test_db):
+    await test_db.tasks.insert_one(_task("email", "slow@brand.com"))
+    other = TaskDispatcher(test_db, handlers={"email": None}, lease_seconds=1)
+    reclaimed = []
+
+    async def slow(target, tasks):
+        await asyncio.sleep(1.5)
+        reclaimed.extend(await other.claim_batch("other"))
+
+    await TaskDispatcher(test_db, handlers={"email": slow}, lease_seconds=1).run_once()
+
+    assert reclaimed == []
+    task = await test_db.tasks.find_one({})
+    assert task["status"] == "done" and task["attempts"] == 1
+
+
+async def test_abandoned_last_attempt_is_dead_lettered(test_db):
+    # the worker holding the final attempt died before recording an outcome
+    await test_db.tasks.insert_one({
+        **_task("email", "poison@brand.com"),
+        "status": "processing", "attempts": 2, "leaseToken": "gone", "leaseUntil": now() - timedelta(seconds=1),
+    })
+    calls = []
+
+    async def handler(target, tasks):
+        calls.append(target)
+
+    assert await TaskDispatcher(test_db, handlers={"email": handler}, max_attempts=2).run_once() == 0
+    task = await test_db.tasks.find_one({})
+    assert calls == [] and task["status"] == "dead" and task["attempts"] == 2
+    assert "leaseToken" not in task
@@ -0,0 +1,57 @@
+from prometheus_client import REGISTRY
+from services import doc_cache
+
+
+def _lookups(result):
+    return REGISTRY.get_sample_value("doc_cache_lookups_total", {"result": result}) or 0
+
+
+def test_lru_and_generations(monkeypatch):
+    monkeypatch.setattr(doc_cache.settings, "DOC_CACHE_MAX_ENTRIES", 2)
+    doc_cache.clear()
+    doc_cache.put("a", "u1", 1, 'W/"a"', b"{}")
+    doc_cache.put("b", "u1", 1, 'W/"b"', b"{}")
+    assert doc_cache.get("a", 1) == ("u1", 'W/"a"', b"{}")
+    doc_cache.put("c", "u2", 5, 'W/"c"', b"{}")
+    assert doc_cache.get("b", 1) is None  # least recently used was evicted
+    assert doc_cache.owner_of("c") == "u2"
+
+    # the owner wrote something since
+    assert doc_cache.get("a", 2) is None
+    assert doc_cache.owner_of("a") is None
+
+    # an entry stored without a trustworthy generation only remembers the owner
+    doc_cache.put("d", "u3", None, 'W/"d"', b"{}")
+    assert doc_cache.owner_of("d") == "u3"
+    assert doc_cache.get("d", 0) is None
+    assert REGISTRY.get_sample_value("doc_cache_entries") == 1
+
+
+async def test_get_doc_served_from_cache_until_next_write(client, make_token):
+    token = make_token("dc1", "dc@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def upload(name):
+        res = await client.post(
+            "/v1/docs", headers=headers,
+            data={"primaryTag": "detail", "secondaryTags": "extra"}, files={"file": (name, b"123", "image/png")},
+        )
+        return res.json()["id"]
+
+    doc_id = await upload("a.png")
+    first = await client.get(f"/v1/docs/{doc_id}", headers=headers)
+    assert first.status_code == 200
+    body = first.json()
+    assert body["_id"] == doc_id and body["filename"] == "a.png"
+    assert sorted(body["tags"]) == ["detail", "extra"]  # ObjectId-linked tags are found too
+
+    hits = _lookups("hit")
+    second = await client.get(f"/v1/docs/{doc_id}", headers=headers)
+    assert second.json() == body
+    assert second.headers["etag"] == first.headers["etag"]
+    assert _lookups("hit") == hits + 1
+
+    await upload("b.png")
+    third = await client.get(f"/v1/docs/{doc_id}", headers=headers)
+    assert third.json() == body
+    assert _lookups("hit") == hits + 1
@@ -1,3 +1,4 @@
+import json
 import base64
 import io
 from bson import ObjectId
@@ -42,3 +43,92 @@ async def test_primary_tag_uniqueness(client, test_db, make_token):
     links = await test_db.document_tags.find({"documentId": ObjectId(doc_id)}).to_list(None)
     primaries = [x for x in links if x["isPrimary"]]
     assert len(primaries) == 1
+
+
+async def test_list_docs_serializes_raw_mongo_fields(client, make_token):
+    token = make_token("u1", "user1@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    resp = await client.post(
+        "/v1/docs", headers=headers,
+        data={"primaryTag": "finance"}, files={"file": ("x.png", b"123", "image/png")},
+    )
+    doc_id = resp.json()["id"]
+
+    resp = await client.get("/v1/docs", headers=headers)
+    assert resp.status_code == 200
+    doc = resp.json()[0]
+    assert doc["_id"] == doc_id
+    assert doc["tags"] == ["finance"]
+    assert isinstance(doc["createdAt"], str)
+
+
+async def test_export_streams_csv_and_ndjson(client, make_token):
+    token = make_token("exp1", "exp@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    for name in ("a.png", "b.png"):
+        await client.post(
+            "/v1/docs", headers=headers,
+            data={"primaryTag": "export", "secondaryTags": "q3"}, files={"file": (name, b"123", "image/png")},
+        )
+
+    resp = await client.get("/v1/docs/export?format=csv&fields=filename,tags", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    lines = resp.text.strip().splitlines()
+    assert lines[0] == "filename,tags"
+    assert sorted(lines[1:]) == ["a.png,export|q3", "b.png,export|q3"]
+
+    resp = await client.get("/v1/docs/export?format=ndjson&fields=id,filename", headers=headers)
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert {r["filename"] for r in rows} == {"a.png", "b.png"}
+    assert all(set(r) == {"id", "filename"} for r in rows)
+
+    resp = await client.get("/v1/docs/export?fields=password", headers=headers)
+    assert resp.status_code == 400
+
+
+def test_render_thumbnails_bounds_and_aspect():
+    from PIL import Image
+    from services.thumbnails import render_thumbnails
+
+    buf = io.BytesIO()
+    Image.new("RGBA", (1200, 600), (255, 0, 0, 128)).save(buf, "PNG")
+    thumbs = render_thumbnails(buf.getvalue())
+
+    assert set(thumbs) == {128, 256, 512}
+    for size, jpeg in thumbs.items():
+        with Image.open(io.BytesIO(jpeg)) as img:
+            assert img.format == "JPEG"
+            assert img.size == (size, size // 2)
+
+
+async def test_thumbnail_generated_lazily_and_cached(client, test_db, make_token):
+    from PIL import Image
+
+    token = make_token("th1", "th@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    buf = io.BytesIO()
+    Image.new("RGB", (800, 800), "blue").save(buf, "PNG")
+    resp = await client.post(
+        "/v1/docs", headers=headers,
+        data={"primaryTag": "thumbs"}, files={"file": ("big.png", buf.getvalue(), "image/png")},
+    )
+    doc_id = resp.json()["id"]
+    # simulate a document uploaded before thumbnails existed
+    await test_db.documents.update_one({"_id": ObjectId(doc_id)}, {"$unset": {"thumbnails": ""}})
+
+    resp = await client.get(f"/v1/docs/{doc_id}/thumbnail?size=128", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/jpeg"
+    assert "immutable" in resp.headers["cache-control"]
+    doc = await test_db.documents.find_one({"_id": ObjectId(doc_id)})
+    assert set(doc["thumbnails"]) == {"128", "256", "512"}
+
+    resp = await client.get(
+        f"/v1/docs/{doc_id}/thumbnail?size=128", headers={**headers, "If-None-Match": resp.headers["etag"]}
+    )
+    assert resp.status_code == 304
+
+    resp = await client.get(f"/v1/docs/{doc_id}/thumbnail?size=100", headers=headers)
+    assert resp.status_code == 400
@@ -0,0 +1,74 @@
+from bson import ObjectId
+from app.responses import etag_matches, weak_etag
+from services import generations
+
+
+def test_weak_comparison():
+    etag = weak_etag("docs", "user", "u1", 3)
+    assert etag.startswith('W/"') and etag != weak_etag("docs", "user", "u1", 4)
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag.removeprefix("W/"), etag)
+    assert etag_matches(f'W/"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+async def test_lists_revalidate_until_next_upload(client, make_token):
+    token = make_token("et1", "et@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def upload(name):
+        await client.post(
+            "/v1/docs", headers=headers,
+            data={"primaryTag": "polling"}, files={"file": (name, b"123", "image/png")},
+        )
+
+    await upload("a.png")
+    etags = {}
+    for url in ("/v1/docs", "/v1/folders"):
+        first = await client.get(url, headers=headers)
+        etags[url] = first.headers["etag"]
+        assert etags[url].startswith("W/")
+
+        again = await client.get(url, headers={**headers, "If-None-Match": etags[url]})
+        assert again.status_code == 304 and again.content == b""
+        assert again.headers["etag"] == etags[url]
+
+    # the generation moved: fresh bodies (five /v1/docs calls, within its rate limit)
+    await upload("b.png")
+    res = await client.get("/v1/folders", headers={**headers, "If-None-Match": etags["/v1/folders"]})
+    assert res.status_code == 200 and res.json()[0]["count"] == 2
+    res = await client.get("/v1/docs", headers={**headers, "If-None-Match": etags["/v1/docs"]})
+    assert res.status_code == 200
+    assert {d["filename"] for d in res.json()} == {"a.png", "b.png"}
+
+
+async def test_get_doc_revalidates_on_version(client, test_db, make_token):
+    token = make_token("et2", "et2@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    res = await client.post(
+        "/v1/docs", headers=headers,
+        data={"primaryTag": "polling"}, files={"file": ("a.png", b"123", "image/png")},
+    )
+    doc_id = res.json()["id"]
+
+    first = await client.get(f"/v1/docs/{doc_id}", headers=headers)
+    etag = first.headers["etag"]
+    assert "version" not in first.json()
+    res = await client.get(f"/v1/docs/{doc_id}", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 304
+
+    # revalidation still enforces ownership
+    other = {"Authorization": f"Bearer {make_token('et3', 'et3@test.com', 'user')}"}
+    res = await client.get(f"/v1/docs/{doc_id}", headers={**other, "If-None-Match": etag})
+    assert res.status_code == 403
+
+    # a document write, as the routes do it: bump its version, then the owner's generation
+    await test_db.documents.update_one(
+        {"_id": ObjectId(doc_id)}, {"$set": {"classification": "invoice"}, "$inc": {"version": 1}}
+    )
+    await generations.bump(test_db, "et2")
+    res = await client.get(f"/v1/docs/{doc_id}", headers={**headers, "If-None-Match": etag})
+    assert res.status_code == 200 and res.json()["classification"] == "invoice"
+    assert res.headers["etag"] != etag
@@ -1,4 +1,9 @@
+import io, zipfile
 import pytest
+from datetime import datetime
+from app.utils import now
+from services import blobs
+from services.archive import stream_zip
 
 async def test_list_folders(client, make_token):
     token = make_token("u1", "u1@test.com", "user")
@@ -9,3 +14,81 @@ async def test_list_folders(client, make_token):
     )
     assert resp.status_code == 200
     assert isinstance(resp.json(), list)
+
+
+async def _entries(files):
+    async def chunks(data):
+        for i in range(0, len(data), 7):
+            yield data[i:i + 7]
+
+    for name, data in files.items():
+        yield name, datetime(2024, 1, 2, 3, 4, 5), len(data), chunks(data)
+
+
+@pytest.mark.parametrize("mode", ["store", "deflate"])
+async def test_stream_zip_round_trips(mode):
+    files = {"a.txt": b"hello world " * 50, "b.png": b"\x89PNG" + bytes(range(256)), "empty.txt": b""}
+    parts = [part async for part in stream_zip(_entries(files), mode)]
+
+    assert len(parts) > 3  # emitted incrementally, not as one buffer
+    with zipfile.ZipFile(io.BytesIO(b"".join(parts))) as zf:
+        assert zf.testzip() is None
+        assert {name: zf.read(name) for name in zf.namelist()} == files
+
+
+def _png(color) -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+async def test_archive_folder(client, test_db, make_token):
+    token = make_token("arc1", "arc@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    scans = {"scan.png": _png("red"), "scan (2).png": _png("blue")}
+    for data in scans.values():
+        res = await client.post(
+            "/v1/docs", headers=headers,
+            data={"primaryTag": "archive"}, files={"file": ("scan.png", data, "image/png")},
+        )
+        assert res.status_code == 200
+
+    # text documents only come from action outputs; file one into the folder the same way
+    notes = b"notes.txt" * 100
+    gridfs_id = await blobs.store(test_db, notes, "notes.txt", {"ownerId": "arc1", "contentType": "text/plain"})
+    result = await test_db.documents.insert_one(
+        {"ownerId": "arc1", "filename": "notes.txt", "mime": "text/plain", "gridfsId": gridfs_id, "createdAt": now()}
+    )
+    tag = await test_db.tags.find_one({"ownerId": "arc1", "name": "archive"})
+    await test_db.document_tags.insert_one({"documentId": result.inserted_id, "tagId": tag["_id"], "isPrimary": True})
+
+    resp = await client.get("/v1/folders/archive/archive?mode=deflate", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert sorted(zf.namelist()) == ["notes.txt", "scan (2).png", "scan.png"]
+        assert zf.read("notes.txt") == notes
+        assert {name: zf.read(name) for name in scans} == scans
+
+    resp = await client.get("/v1/folders/missing/archive", headers=headers)
+    assert resp.status_code == 404
+
+
+async def test_archive_folder_audits_cached_tag(client, test_db, make_token):
+    token = make_token("arc2", "arc2@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    res = await client.post(
+        "/v1/docs", headers=headers,
+        data={"primaryTag": "audited"}, files={"file": ("red.png", _png("red"), "image/png")},
+    )
+    assert res.status_code == 200
+
+    # the upload put the tag in the cache, so the archive resolves it from there
+    resp = await client.get("/v1/folders/audited/archive", headers=headers)
+    assert resp.status_code == 200
+    tag = await test_db.tags.find_one({"ownerId": "arc2", "name": "audited"})
+    entry = await test_db.audit_logs.find_one({"action": "archive_folder", "userId": "arc2"})
+    assert entry["entityId"] == str(tag["_id"])
+    assert entry["metadata"]["documents"] == 1
@@ -1,3 +1,12 @@
+from datetime import datetime, timezone, timedelta
+from services.audit import log_events, run_rollup_job, count_events
+from pymongo import monitoring
+from prometheus_client import REGISTRY
+from app import db_monitoring
+from app.db_monitoring import PoolMetricsListener, CommandMetricsListener
+import logging
+
+
 async def test_metrics_endpoint(client, make_token):
     token = make_token("admin1", "a@test.com", "admin")
 
@@ -11,3 +20,107 @@ async def test_metrics_endpoint(client, make_token):
     assert "folders_total" in body
     assert "actions_month" in body
     assert "tasks_today" in body
+
+
+async def test_metrics_rollup_tracks_writes(client, test_db, make_token):
+    token = make_token("metrics-u1", "m@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    resp = await client.get("/v1/metrics", headers=headers)
+    assert resp.json()["docs_total"] == 0
+
+    for tag in ("alpha", "beta"):
+        await client.post(
+            "/v1/docs",
+            headers=headers,
+            data={"primaryTag": tag, "secondaryTags": "shared"},
+            files={"file": ("x.png", b"img", "image/png")}
+        )
+
+    body = (await client.get("/v1/metrics", headers=headers)).json()
+    assert body["docs_total"] == 2
+    assert body["folders_total"] == 3
+
+    rollup = await test_db.metric_rollups.find_one({"_id": "owner:metrics-u1"})
+    assert rollup["docs_total"] == 2
+
+
+async def test_audit_rollups_match_raw_events(test_db):
+    now = datetime.now(timezone.utc).replace(minute=30, second=0, microsecond=0)
+    events = [
+        {"userId": "r1", "action": "run_actions", "at": now - timedelta(hours=h)}
+        for h in (0, 1, 1, 3, 30)
+    ]
+    await log_events(test_db, events)
+
+    since = (now - timedelta(days=3)).replace(minute=0)
+    before = await count_events(test_db, "run_actions", since, "r1")
+    await run_rollup_job(test_db)
+    after = await count_events(test_db, "run_actions", since, "r1")
+
+    assert before == after == 5
+    # the current hour stays raw until it closes
+    assert await test_db.audit_rollups.count_documents({"_id.period": "hour"}) == 3
+
+
+
+async def test_audit_rollups_count_legacy_rows_and_late_inserts(test_db):
+    now = datetime.now(timezone.utc).replace(minute=30, second=0, microsecond=0)
+    since = (now - timedelta(days=1)).replace(minute=0)
+    # written before audit rows carried `meta`
+    await test_db.audit_logs.insert_one({"performedBy": "r2", "action": "run_actions", "at": now - timedelta(hours=2)})
+    assert await count_events(test_db, "run_actions", since, "r2") == 1
+    await run_rollup_job(test_db)
+    assert await count_events(test_db, "run_actions", since, "r2") == 1
+
+    # a slow insert that commits after its hour was rolled up
+    await log_events(test_db, [{"userId": "r2", "action": "run_actions", "at": now - timedelta(hours=1)}])
+    await run_rollup_job(test_db)
+    assert await count_events(test_db, "run_actions", since, "r2") == 2
+
+def test_pool_listener_exports_checkout_wait_and_usage():
+    listener = PoolMetricsListener()
+    addr = ("pool-test", 27017)
+    labels = {"address": "pool-test:27017"}
+
+    listener.pool_created(monitoring.PoolCreatedEvent(addr, {}))
+    listener.connection_created(monitoring.ConnectionCreatedEvent(addr, 1))
+    listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(addr, 1, 0.25))
+
+    assert REGISTRY.get_sample_value("mongo_pool_connections", labels) == 1
+    assert REGISTRY.get_sample_value("mongo_pool_in_use", labels) == 1
+    assert REGISTRY.get_sample_value("mongo_pool_checkout_wait_seconds_sum", labels) == 0.25
+
+    listener.connection_checked_in(monitoring.ConnectionCheckedInEvent(addr, 1))
+    assert REGISTRY.get_sample_value("mongo_pool_in_use", labels) == 0
+
+
+def test_command_listener_labels_and_slow_log(caplog):
+    listener = CommandMetricsListener(slow_ms=50)
+    conn = ("cmd-test", 27017)
+    command = {"find": "slow_docs", "filter": {"ownerId": "secret-user", "mime": {"$ne": "text/plain"}}}
+
+    listener.started(monitoring.CommandStartedEvent(command, "db", 7, conn, 7))
+    with caplog.at_level(logging.WARNING, logger="mongo.slow"):
+        listener.succeeded(monitoring.CommandSucceededEvent(timedelta(milliseconds=80), {}, "find", 7, conn, 7))
+
+    labels = {"command": "find", "collection": "slow_docs"}
+    assert REGISTRY.get_sample_value("mongo_command_duration_seconds_count", labels) == 1
+    assert "slow_docs" in caplog.text
+    assert '"$ne": "?"' in caplog.text
+    assert "secret-user" not in caplog.text
+
+
+def test_command_listener_only_redacts_slow_commands(monkeypatch):
+    shaped = []
+    monkeypatch.setattr(db_monitoring, "_query_shape", lambda name, command: shaped.append(command))
+    listener = CommandMetricsListener(slow_ms=50)
+    conn = ("cmd-fast", 27017)
+
+    for request_id, ms in ((8, 5), (9, 80)):
+        command = {"find": "fast_docs", "filter": {"ownerId": f"user-{request_id}"}}
+        listener.started(monitoring.CommandStartedEvent(command, "db", request_id, conn, request_id))
+        listener.succeeded(monitoring.CommandSucceededEvent(timedelta(milliseconds=ms), {}, "find", request_id, conn, request_id))
+
+    assert shaped == [{"find": "fast_docs", "filter": {"ownerId": "user-9"}}]
+    assert listener._inflight == {}
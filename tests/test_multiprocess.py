@@ -0,0 +1,89 @@
+import os, signal, socket, subprocess, sys, time, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+pytest.importorskip("gunicorn")
+pytest.importorskip("uvicorn_worker")
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKERS = 3
+REQUESTS = 90
+
+
+def _get(port, path):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as resp:
+        return resp.read().decode()
+
+
+def _sample(port, name, labels):
+    total = 0.0
+    for family in text_string_to_metric_families(_get(port, "/metrics")):
+        for s in family.samples:
+            if s.name == name and all(s.labels.get(k) == v for k, v in labels.items()):
+                total += s.value
+    return total
+
+
+def _worker_pids(path):
+    return {int(f.stem.rsplit("_", 1)[1]) for f in path.glob("counter_*.db")}
+
+
+@pytest.fixture
+def gunicorn_server(tmp_path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = {k: v for k, v in os.environ.items() if k != "PYTEST_CURRENT_TEST"}
+    env.update({
+        "PROMETHEUS_MULTIPROC_DIR": str(tmp_path),
+        "WEB_CONCURRENCY": str(WORKERS),
+        "BIND": f"127.0.0.1:{port}",
+        "FAST_START": "1",
+    })
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while len(_worker_pids(tmp_path)) < WORKERS or not _ready(port):
+        assert proc.poll() is None and time.monotonic() < deadline, "gunicorn did not start"
+        time.sleep(0.1)
+    yield port, tmp_path
+    proc.send_signal(signal.SIGTERM)
+    proc.wait(timeout=30)
+
+
+def _ready(port):
+    try:
+        _get(port, "/health")
+        return True
+    except OSError:
+        return False
+
+
+def test_counters_are_exact_across_workers(gunicorn_server):
+    port, _ = gunicorn_server
+    labels = {"handler": "/health", "method": "GET"}
+    before = _sample(port, "http_requests_total", labels)
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        list(pool.map(lambda _: _get(port, "/health"), range(REQUESTS)))
+
+    assert _sample(port, "http_requests_total", labels) - before == REQUESTS
+
+
+def test_dead_worker_live_gauges_are_removed(gunicorn_server):
+    port, path = gunicorn_server
+    victim = next(iter(_worker_pids(path)))
+    assert (path / f"gauge_livesum_{victim}.db").exists()
+
+    os.kill(victim, signal.SIGKILL)
+    deadline = time.monotonic() + 15
+    while (path / f"gauge_livesum_{victim}.db").exists():
+        assert time.monotonic() < deadline, "dead worker's live gauges were not cleaned up"
+        time.sleep(0.1)
+    # its counters are kept, so totals never go backwards
+    assert (path / f"counter_{victim}.db").exists()
+    assert _ready(port)
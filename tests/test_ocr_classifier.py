@@ -0,0 +1,69 @@
+import random
+import string
+import time
+from services.ocr_classifier import extract_unsubscribe, extract_unsubscribe_candidates
+
+
+def test_mailto_is_preferred():
+    unsub = extract_unsubscribe("LIMITED TIME SALE! unsubscribe: mailto:test@brand.com")
+    assert unsub["type"] == "email"
+    assert unsub["value"] == "test@brand.com"
+
+
+def test_returns_all_candidates_with_confidence():
+    text = (
+        "BIG SALE.\nTo unsubscribe visit https://brand.com/unsub?id=1,\n"
+        "or write to help@brand.co.uk."
+    )
+    candidates = extract_unsubscribe_candidates(text)
+    values = {c["value"] for c in candidates}
+    assert values == {"https://brand.com/unsub?id=1", "help@brand.co.uk"}
+    assert all(0 < c["confidence"] <= 1 for c in candidates)
+
+
+def test_targets_without_cue_have_lower_confidence():
+    with_cue = extract_unsubscribe("unsubscribe: deals@shop.com")
+    without_cue = extract_unsubscribe("contact deals@shop.com")
+    assert with_cue["value"] == without_cue["value"] == "deals@shop.com"
+    assert with_cue["confidence"] > without_cue["confidence"]
+
+
+def test_targets_far_from_cue_are_ignored():
+    text = "far@away.com " + "x " * 2000 + "unsubscribe: near@brand.com"
+    assert [c["value"] for c in extract_unsubscribe_candidates(text)] == ["near@brand.com"]
+
+
+def test_no_target():
+    assert extract_unsubscribe("") is None
+    assert extract_unsubscribe("thank you for shopping, unsubscribe anytime") is None
+
+
+def test_fuzz_random_ocr_noise():
+    rng = random.Random(1234)
+    alphabet = string.ascii_letters + string.digits + "@.:/-_+%,;\n\r \t"
+    for _ in range(300):
+        noise = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 400)))
+        target = f"user{rng.randint(0, 999)}@brand{rng.randint(0, 9)}.com"
+        text = f"{noise} unsubscribe: {target} {noise}"
+        candidates = extract_unsubscribe_candidates(text)
+        assert target in {c["value"] for c in candidates}
+        for c in candidates:
+            assert c["type"] in {"email", "url"}
+            assert c["value"] in text
+
+
+def _best_time(text, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        extract_unsubscribe_candidates(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_linear_time_on_adversarial_input():
+    # A quadratic scan would grow ~64x between these sizes; linear grows ~8x
+    for unit in ["a", "a@", "a.", "a@a.", "http://", "mailto:", "unsubscribe "]:
+        small = _best_time(unit * 10_000)
+        large = _best_time(unit * 80_000)
+        assert large < max(small, 1e-4) * 24, unit
@@ -0,0 +1,64 @@
+from app import profiler
+
+
+async def test_profile_requires_admin(client, make_token):
+    token = make_token("u1", "u1@test.com", "user")
+    resp = await client.post(
+        "/admin/profile?seconds=0.1",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert resp.status_code == 403
+
+
+async def test_timed_profile_speedscope(client, admin_token):
+    resp = await client.post(
+        "/admin/profile?seconds=0.2&format=speedscope",
+        headers={"Authorization": f"Bearer {admin_token}"}
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["profiles"][0]["type"] == "sampled"
+    assert len(body["profiles"][0]["samples"]) == len(body["profiles"][0]["weights"])
+
+
+async def test_profile_next_matching_requests(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    resp = await client.post("/admin/profile?requests=2&route=/health", headers=headers)
+    session_id = resp.json()["id"]
+
+    resp = await client.get(f"/admin/profile/{session_id}", headers=headers)
+    assert resp.status_code == 202
+
+    for _ in range(2):
+        await client.get("/health")
+
+    resp = await client.get(f"/admin/profile/{session_id}", headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+
+
+def test_request_session_times_out_without_matching_requests(monkeypatch):
+    monkeypatch.setattr(profiler.settings, "PROFILER_SESSION_TIMEOUT", 0.05)
+    session = profiler.start_request_session("/never-hit", 5)
+    session.profiler._thread.join(timeout=1)
+    assert not session.profiler._thread.is_alive()  # the sampler stopped at the deadline
+
+    assert profiler.get_session(session.id) is session
+    assert session.done and session.outcome == "timeout"
+    assert profiler.active_session is None
+
+
+async def test_cancel_request_profile(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    session_id = (await client.post("/admin/profile?requests=3&route=/health", headers=headers)).json()["id"]
+    await client.get("/health")
+
+    resp = await client.delete(f"/admin/profile/{session_id}", headers=headers)
+    assert resp.json() == {"id": session_id, "status": "cancelled", "remaining": 2}
+    assert (await client.delete(f"/admin/profile/{session_id}", headers=headers)).status_code == 409
+    assert (await client.get(f"/admin/profile/{session_id}", headers=headers)).status_code == 200
+
+    # a new session can start right away
+    resp = await client.post("/admin/profile?requests=1&route=/health", headers=headers)
+    assert resp.status_code == 200
+    profiler.cancel_session(resp.json()["id"])
@@ -0,0 +1,57 @@
+import asyncio
+from pymongo.errors import DuplicateKeyError
+from services.rate_limit import consume_quota, consume_quota_upto, ensure_rate_limit_indexes
+
+
+class _LostInsertRace:
+    """rate_limits stand-in whose first upsert loses the insert to a concurrent request."""
+
+    def __init__(self, count):
+        self.count = count
+        self.calls = []
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        self.calls.append(upsert)
+        if upsert:
+            raise DuplicateKeyError("E11000 duplicate key error")
+        if self.count > query["count"]["$lte"]:
+            return None
+        self.count += update["$inc"]["count"]
+        return {"key": query["key"], "count": self.count}
+
+
+class _Db:
+    def __init__(self, rate_limits):
+        self.rate_limits = rate_limits
+
+
+async def test_consume_quota_retries_lost_insert_race():
+    counters = _LostInsertRace(count=1)
+    assert await consume_quota(_Db(counters), "k", 3) == (True, 2)
+    assert counters.calls == [True, False]
+
+    # the retry only rejects when the existing counter has no room
+    counters = _LostInsertRace(count=3)
+    assert await consume_quota(_Db(counters), "k", 3) == (False, None)
+    assert counters.count == 3
+
+
+async def test_rate_limit_indexes(test_db):
+    await ensure_rate_limit_indexes(test_db)
+    indexes = {tuple(k for k, _ in i["key"]): i for i in (await test_db.rate_limits.index_information()).values()}
+    assert indexes[("key",)]["unique"] is True
+    assert "expireAfterSeconds" in indexes[("createdAt",)]
+
+
+async def test_concurrent_first_requests_share_a_fresh_key(test_db):
+    results = await asyncio.gather(*(consume_quota(test_db, "fresh", 10) for _ in range(10)))
+    assert all(allowed for allowed, _ in results)
+    assert sorted(count for _, count in results) == list(range(1, 11))
+    assert await consume_quota(test_db, "fresh", 10) == (False, None)
+
+
+async def test_consume_quota_upto_takes_remaining_room_at_once(test_db):
+    assert await consume_quota_upto(test_db, "bulk", 1000, 3) == (3, 3)
+    assert await consume_quota_upto(test_db, "bulk", 1000, 5000) == (997, 1000)
+    assert await consume_quota_upto(test_db, "bulk", 1000, 1) == (0, None)
+    assert (await test_db.rate_limits.find_one({"key": "bulk"}))["count"] == 1000
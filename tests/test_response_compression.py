@@ -0,0 +1,100 @@
+import asyncio, gzip, zlib
+from httpx import ASGITransport, AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from app.response_compression import CompressionMiddleware, choose_encoding
+
+BIG = [{"id": i, "text_snippet": "invoice total due " * 10} for i in range(200)]
+
+
+async def big(request):
+    return JSONResponse(BIG)
+
+
+async def small(request):
+    return JSONResponse({"ok": True})
+
+
+async def png(request):
+    return Response(b"\x89PNG" + bytes(4096), media_type="image/png")
+
+
+async def ndjson(request):
+    async def rows():
+        for i in range(3):
+            yield f'{{"row": {i}}}\n'.encode()
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+app = CompressionMiddleware(
+    Starlette(routes=[Route(p, f) for p, f in (("/big", big), ("/small", small), ("/png", png), ("/ndjson", ndjson))]),
+    minimum_size=1024,
+)
+
+
+def _client():
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("gzip;q=1, br;q=0.5") == "gzip"
+    assert choose_encoding("br;q=0, gzip") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("*") == "br"
+    assert choose_encoding(None) is None
+
+
+async def test_negotiates_and_respects_threshold():
+    async with _client() as client:
+        res = await client.get("/big", headers={"Accept-Encoding": "br"})
+        assert res.headers["content-encoding"] == "br"
+        assert res.headers["vary"] == "Accept-Encoding"
+        assert int(res.headers["content-length"]) < len(JSONResponse(BIG).body)
+        assert res.json() == BIG
+
+        res = await client.get("/big", headers={"Accept-Encoding": "gzip"})
+        assert res.headers["content-encoding"] == "gzip"
+        assert res.json() == BIG
+
+        res = await client.get("/big", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in res.headers
+
+        res = await client.get("/small", headers={"Accept-Encoding": "gzip, br"})
+        assert "content-encoding" not in res.headers
+
+        res = await client.get("/png", headers={"Accept-Encoding": "gzip, br"})
+        assert "content-encoding" not in res.headers
+        assert len(res.content) == 4100
+
+
+async def test_streamed_chunks_are_flushed_one_by_one():
+    sent = []
+    requested = []
+
+    async def receive():
+        if requested:
+            await asyncio.Event().wait()  # the client never disconnects
+        requested.append(True)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": "/ndjson", "raw_path": b"/ndjson", "root_path": "",
+        "query_string": b"", "headers": [(b"accept-encoding", b"gzip")], "scheme": "http",
+        "server": ("test", 80), "client": ("test", 1), "http_version": "1.1",
+    }
+    await app(scope, receive, send)
+
+    start, *bodies = sent
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+
+    # every chunk decodes to complete rows without waiting for the end of the stream
+    decoder = zlib.decompressobj(wbits=31)
+    rows = [decoder.decompress(m["body"]) for m in bodies if m.get("more_body")]
+    assert rows[:3] == [b'{"row": 0}\n', b'{"row": 1}\n', b'{"row": 2}\n']
+    assert gzip.decompress(b"".join(m["body"] for m in bodies)) == b'{"row": 0}\n{"row": 1}\n{"row": 2}\n'
@@ -0,0 +1,52 @@
+from prometheus_client import REGISTRY
+from services import search_cache
+
+
+def _lookups(result):
+    return REGISTRY.get_sample_value("search_cache_lookups_total", {"result": result}) or 0
+
+
+def test_lru_eviction_and_generations(monkeypatch):
+    monkeypatch.setattr(search_cache.settings, "SEARCH_CACHE_MAX_ENTRIES", 2)
+    search_cache.clear()
+    a = search_cache.make_key("u1", " Invoice ", None, [])
+    b = search_cache.make_key("u1", "receipt", None, [])
+    c = search_cache.make_key("u1", "tax", "files", ["2", "1"])
+
+    assert a == search_cache.make_key("u1", "invoice", None, [])
+    assert c == search_cache.make_key("u1", "tax", "files", ["1", "2"])
+
+    search_cache.put(a, 1, 200, b"[1]")
+    search_cache.put(b, 1, 200, b"[2]")
+    assert search_cache.get(a, 1) == (200, b"[1]")  # a is now most recent
+    search_cache.put(c, 1, 404, "none")
+    assert search_cache.get(b, 1) is None  # least recently used was evicted
+    assert search_cache.get(c, 1) == (404, "none")
+
+    # a write moved the owner to generation 2
+    assert search_cache.get(a, 2) is None
+    assert len(search_cache._entries) == 1
+    assert REGISTRY.get_sample_value("search_cache_entries") == 1
+    assert REGISTRY.get_sample_value("search_cache_bytes") > 0
+
+
+async def test_search_is_cached_until_next_upload(client, make_token):
+    token = make_token("sc1", "sc@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def upload(name):
+        await client.post(
+            "/v1/docs", headers=headers,
+            data={"primaryTag": "cache"}, files={"file": (name, b"123", "image/png")},
+        )
+
+    await upload("invoice-1.png")
+    hits = _lookups("hit")
+    first = await client.get("/v1/docs/search?q=invoice", headers=headers)
+    second = await client.get("/v1/docs/search?q=INVOICE ", headers=headers)
+    assert first.json() == second.json()
+    assert _lookups("hit") == hits + 1
+
+    await upload("invoice-2.png")
+    third = await client.get("/v1/docs/search?q=invoice", headers=headers)
+    assert {d["filename"] for d in third.json()} == {"invoice-1.png", "invoice-2.png"}
@@ -0,0 +1,17 @@
+import subprocess, sys
+
+DEFERRED = ("openai", "passlib", "httpx", "PIL")
+
+
+def test_import_does_not_load_deferred_modules():
+    code = "import sys, app.main; print(','.join(m for m in %r if m in sys.modules))" % (DEFERRED,)
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", code], check=True, capture_output=True, text=True)
+    assert out.stdout.strip() == ""
+
+
+def test_openai_client_is_created_once_on_first_use():
+    from app import llm
+
+    llm._openai_client = None
+    client = llm.get_openai_client()
+    assert client is llm.get_openai_client()
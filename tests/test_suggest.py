@@ -0,0 +1,29 @@
+from services.trigram_index import filename_terms, trigrams
+
+
+def test_trigrams_and_filename_terms():
+    assert trigrams("Inv") == ["  i", " in", "inv", "nv "]
+    assert filename_terms("IMG_20240101_Invoice-ACME.v2.png") == {"img", "invoice", "acme", "v2"}
+    assert filename_terms(None) == set()
+
+
+async def test_suggest_ranks_partial_and_misspelled_terms(client, make_token):
+    token = make_token("sg1", "sg@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+    for name, tag in (("invoice_acme.png", "finance"), ("invoice_globex.png", "finance"), ("receipt.png", "travel")):
+        await client.post(
+            "/v1/docs", headers=headers,
+            data={"primaryTag": tag, "secondaryTags": "invoices"}, files={"file": (name, b"123", "image/png")},
+        )
+
+    resp = await client.get("/v1/docs/suggest?q=invoce", headers=headers)
+    assert resp.status_code == 200
+    top = resp.json()[0]
+    assert (top["term"], top["kind"], top["count"]) == ("invoice", "filename", 2)
+
+    terms = {(s["term"], s["kind"]) for s in (await client.get("/v1/docs/suggest?q=fin", headers=headers)).json()}
+    assert ("finance", "tag") in terms
+
+    other = make_token("sg2", "other@test.com", "user")
+    resp = await client.get("/v1/docs/suggest?q=invoice", headers={"Authorization": f"Bearer {other}"})
+    assert resp.json() == []
@@ -0,0 +1,62 @@
+from prometheus_client import REGISTRY
+from services import tag_cache
+
+
+def _lookups(result):
+    return REGISTRY.get_sample_value("tag_cache_lookups_total", {"result": result}) or 0
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    monkeypatch.setattr(tag_cache.settings, "TAG_CACHE_MAX_ENTRIES", 2)
+    tag_cache.clear()
+    tag_cache.put("u1", "a", 1)
+    tag_cache.put("u1", "b", 2)
+    assert tag_cache._get("u1", "a") == 1  # a is now most recent
+    tag_cache.put("u2", "a", 3)
+    assert tag_cache._get("u1", "b") is None
+    assert tag_cache._get("u2", "a") == 3
+
+    tag_cache.invalidate("u2", "a")
+    assert tag_cache._get("u2", "a") is None
+
+    monkeypatch.setattr(tag_cache.settings, "TAG_CACHE_TTL_SECONDS", -1)
+    tag_cache.put("u1", "c", 4)
+    assert tag_cache._get("u1", "c") is None
+    assert ("u1", "c") not in tag_cache._entries
+
+
+async def test_upload_reuses_cached_tag(client, make_token, test_db):
+    token = make_token("tc1", "tc@test.com", "user")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def upload(name):
+        await client.post(
+            "/v1/docs", headers=headers,
+            data={"primaryTag": "bills", "secondaryTags": "home"}, files={"file": (name, b"123", "image/png")},
+        )
+
+    await upload("a.png")
+    hits = _lookups("hit")
+    await upload("b.png")
+    assert _lookups("hit") == hits + 2
+    assert await test_db.tags.count_documents({"ownerId": "tc1"}) == 2
+
+    res = await client.get("/v1/folders/bills/docs", headers=headers)
+    assert {d["filename"] for d in res.json()} == {"a.png", "b.png"}
+
+
+async def test_verify_drops_renamed_and_deleted_tags(test_db):
+    bills, _ = await tag_cache.get_or_create(test_db, "tc2", "bills")
+    home, _ = await tag_cache.get_or_create(test_db, "tc2", "home")
+    again, created = await tag_cache.get_or_create(test_db, "tc2", "bills")
+    assert (again, created) == (bills, False)
+
+    # changed behind this worker's back, as another worker would
+    await test_db.tags.update_one({"_id": bills}, {"$set": {"name": "receipts"}})
+    await test_db.tags.delete_one({"_id": home})
+    stale = REGISTRY.get_sample_value("tag_cache_stale_total") or 0
+
+    assert await tag_cache.verify(test_db) == 2
+    assert REGISTRY.get_sample_value("tag_cache_stale_total") == stale + 2
+    assert await tag_cache.resolve(test_db, "tc2", "bills") is None
+    assert await tag_cache.resolve(test_db, "tc2", "receipts") == bills
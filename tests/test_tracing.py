@@ -0,0 +1,37 @@
+import json
+from app import tracing
+
+
+async def test_server_timing_header_has_phases(client, make_token):
+    token = make_token("t1", "t1@test.com", "user")
+
+    resp = await client.post(
+        "/v1/docs",
+        headers={"Authorization": f"Bearer {token}"},
+        data={"primaryTag": "traced"},
+        files={"file": ("x.png", b"img", "image/png")}
+    )
+    assert resp.status_code == 200
+    timing = resp.headers["Server-Timing"]
+    for phase in ("auth;dur=", "gridfs;dur=", "mongo;dur=", "audit;dur=", "total;dur="):
+        assert phase in timing
+
+
+async def test_file_exporter_writes_nested_spans(tmp_path):
+    exporter = tracing.FileSpanExporter(str(tmp_path / "spans.jsonl"))
+
+    trace, token = tracing.start_trace()
+    try:
+        with tracing.span("outer"):
+            with tracing.span("inner", phase="work", item=1):
+                pass
+    finally:
+        tracing.end_trace(token)
+
+    exporter.export(trace)
+    exporter.flush()
+
+    spans = {s["name"]: s for s in map(json.loads, (tmp_path / "spans.jsonl").read_text().splitlines())}
+    assert spans["inner"]["parentSpanId"] == spans["outer"]["spanId"]
+    assert spans["inner"]["traceId"] == trace.trace_id
+    assert "work;dur=" in trace.server_timing(0.001)
@@ -42,3 +42,51 @@ async def test_webhook_rate_limit(client, make_token):
         json=payload
     )
     assert resp.json()["status"] == "rate_limited"
+
+
+async def test_webhook_batch_rate_limit_per_group(client, test_db, make_token):
+    token = make_token("u3", "u3@test.com", "user")
+
+    ad = {"source": "scanner", "imageId": "i1", "text": "SALE unsubscribe: mailto:x@y.com"}
+    items = [ad] * 4 + [
+        {"source": "mailroom", "imageId": "i2", "text": "SALE unsubscribe: mailto:x@y.com"},
+        {"source": "scanner", "imageId": "i3", "text": "Invoice amount due"},
+        {"source": "scanner"},
+    ]
+
+    resp = await client.post(
+        "/v1/webhooks/ocr/batch",
+        headers={"Authorization": f"Bearer {token}"},
+        json=items
+    )
+    assert resp.status_code == 200
+    results = resp.json()
+    assert [r["index"] for r in results] == list(range(7))
+    assert [("taskId" in r) for r in results[:5]] == [True, True, True, False, True]
+    assert results[3]["status"] == "rate_limited"
+    assert results[5]["classification"] == "official"
+    assert results[6]["status"] == "invalid"
+
+    assert await test_db.tasks.count_documents({"userId": "u3"}) == 4
+    assert await test_db.audit_logs.count_documents({"meta.userId": "u3", "meta.action": "task_create"}) == 4
+    limit = await test_db.rate_limits.find_one({"key": {"$regex": "^u3:scanner:"}})
+    assert limit["count"] == 3
+
+
+async def test_webhook_batch_ndjson(client, make_token):
+    token = make_token("u4", "u4@test.com", "user")
+
+    body = "\n".join([
+        '{"source": "scanner", "imageId": "a", "text": "SALE unsubscribe: mailto:x@y.com"}',
+        '{"source": "scanner", "imageId": "b", "text": "hello"}',
+    ]) + "\n"
+
+    resp = await client.post(
+        "/v1/webhooks/ocr/batch",
+        headers={"Authorization": f"Bearer {token}", "Content-Type": "application/x-ndjson"},
+        content=body
+    )
+    assert resp.status_code == 200
+    results = resp.json()
+    assert results[0]["classification"] == "ad"
+    assert results[1]["classification"] == "other"